@@ -9,7 +9,45 @@ import { spawn } from 'child_process';
 const __filename = fileURLToPath(import.meta.url);
 const __dirname = path.dirname(__filename);
 
+// Keep only the tail of the script's free-text output for error details
+const OUTPUT_TAIL = 4000;
+const appendTail = (buf, chunk) => (buf + chunk).slice(-OUTPUT_TAIL);
+
+// 🔹 Look up the matched voter and send the verification response
+const respondWithVoter = async (res, matchedNid, details) => {
+  if (!matchedNid) {
+    return res.json({
+      success: true,
+      message: 'Face verified but could not extract NID',
+      details,
+    });
+  }
+
+  const voter = await Voter.findOne({ nationalId: matchedNid });
+  if (!voter) {
+    return res.status(404).json({
+      success: false,
+      message: 'Voter not found in database',
+      matchedNid,
+    });
+  }
+
+  res.json({
+    success: true,
+    message: `Face verified for NID ${voter.nationalId}`,
+    voter: {
+      id: voter._id,
+      nationalId: voter.nationalId,
+      name: voter.name,
+      location: voter.location,
+    },
+  });
+};
+
 // 🔹 Verify face using Python script
+// The script writes JSON-lines events (session_started, face_detected,
+// liveness_passed, match, result) to fd 3; we answer as soon as the
+// "result" event arrives instead of waiting for the process to exit.
 export const verifyFace = async (req, res) => {
   try {
     console.log('[VoteController] Starting face verification...');
@@ -23,89 +61,119 @@ export const verifyFace = async (req, res) => {
       });
     }
 
-    const pythonProcess = spawn('python', [faceRecPath], {
+    const pythonProcess = spawn('python', [faceRecPath, '--events-fd', '3'], {
       cwd: faceRecDir,
+      stdio: ['ignore', 'pipe', 'pipe', 'pipe'],
     });
 
     let stdout = '';
     let stderr = '';
+    let events = '';
+    let responded = false;
+
+    const respond = async (fn) => {
+      if (responded) return;
+      responded = true;
+      try {
+        await fn();
+      } catch (error) {
+        console.error('[VoteController] verifyFace response error:', error);
+        if (!res.headersSent) {
+          res.status(500).json({
+            success: false,
+            message: 'Internal server error',
+            error: error.message,
+          });
+        }
+      }
+    };
+
+    const onResult = (result) =>
+      respond(async () => {
+        console.log('[VoteController] face recognition result:', result.result);
+        if (result.result === 'error') {
+          return res.status(500).json({
+            success: false,
+            message: 'Face recognition process failed',
+            error: result.error || 'Unknown error',
+          });
+        }
+        if (result.result !== 'success') {
+          return res.json({
+            success: false,
+            message: 'Face not recognised',
+            details: result,
+          });
+        }
+        await respondWithVoter(res, result.label, result);
+      });
+
+    pythonProcess.stdio[3].on('data', (data) => {
+      events += data.toString();
+      let newline;
+      while ((newline = events.indexOf('\n')) >= 0) {
+        const line = events.slice(0, newline).trim();
+        events = events.slice(newline + 1);
+        if (!line) continue;
+        let event;
+        try {
+          event = JSON.parse(line);
+        } catch {
+          console.error('[VoteController] bad event line:', line);
+          continue;
+        }
+        console.log('[VoteController] face event:', event.event);
+        if (event.event === 'result') {
+          onResult(event);
+        }
+      }
+    });
 
     pythonProcess.stdout.on('data', (data) => {
       const chunk = data.toString();
-      stdout += chunk;
+      stdout = appendTail(stdout, chunk);
       console.log('[VoteController] python stdout:', chunk.trim());
     });
 
     pythonProcess.stderr.on('data', (data) => {
       const chunk = data.toString();
-      stderr += chunk;
+      stderr = appendTail(stderr, chunk);
       console.error('[VoteController] python stderr:', chunk.trim());
     });
 
-    pythonProcess.on('close', async (code) => {
+    pythonProcess.on('close', (code) => {
       console.log(`[VoteController] face recognition exited with code ${code}`);
 
-      if (code !== 0) {
-        return res.status(500).json({
-          success: false,
-          message: 'Face recognition process failed',
-          error: stderr || 'Unknown error',
-        });
-      }
-
-      const outputLower = stdout.toLowerCase();
-      const isSuccess =
-        outputLower.includes('face recognition successful') ||
-        outputLower.includes('result = success');
-
-      if (!isSuccess) {
-        return res.json({
-          success: false,
-          message: 'Face not recognised',
-          details: stdout.trim(),
-        });
-      }
-
-      // ✅ Extract matched NID from stdout
-      const idMatch = stdout.match(/Matched ID:\s*([\w-]+)/i);
-      const matchedNid = idMatch ? idMatch[1].trim() : null;
-
-      if (!matchedNid) {
-        return res.json({
-          success: true,
-          message: 'Face verified but could not extract NID',
-          details: stdout.trim(),
-        });
-      }
-
-      // ✅ Lookup voter by NID
-      const voter = await Voter.findOne({ nationalId: matchedNid });
-      if (!voter) {
-        return res.status(404).json({
-          success: false,
-          message: 'Voter not found in database',
-          matchedNid,
-        });
-      }
-
-      res.json({
-        success: true,
-        message: `Face verified for NID ${voter.nationalId}`,
-        voter: {
-          id: voter._id,
-          nationalId: voter.nationalId,
-          name: voter.name,
-          location: voter.location,
-        },
+      // Normally the result event has been answered already; fall back to
+      // the script's text output if it never arrived.
+      respond(async () => {
+        if (code !== 0) {
+          return res.status(500).json({
+            success: false,
+            message: 'Face recognition process failed',
+            error: stderr || 'Unknown error',
+          });
+        }
+        if (!/result = success/i.test(stdout)) {
+          return res.json({
+            success: false,
+            message: 'Face not recognised',
+            details: stdout.trim(),
+          });
+        }
+        const idMatch = stdout.match(/Matched ID:\s*([\w-]+)/i);
+        await respondWithVoter(res, idMatch ? idMatch[1].trim() : null, stdout.trim());
       });
     });
 
     pythonProcess.on('error', (error) => {
       console.error('[VoteController] Failed to start python:', error);
-      res.status(500).json({
-        success: false,
-        message: 'Failed to launch face recognition',
-        error: error.message,
+      respond(async () => {
+        res.status(500).json({
+          success: false,
+          message: 'Failed to launch face recognition',
+          error: error.message,
+        });
       });
     });
   } catch (error) {
@@ -0,0 +1,116 @@
+from collections import namedtuple
+
+import numpy as np
+
+from gallery import RERANK_K, l2_normalize
+
+# ------------ CONFIG ------------
+SIM_THRESHOLD = 0.5
+AGG_MIN_FRAMES = 3          # never decide on fewer frames
+AGG_REJECT_FRAMES = 10      # never reject on fewer: a few off-pose frames sink the mean
+AGG_MAX_FRAMES = 30         # decide on the point estimate after this many
+AGG_Z = 2.0                 # width of the confidence interval, in standard errors
+AGG_MIN_MARGIN = 0.05       # accepted identity must lead the runner-up by this much
+AGG_STD_FLOOR = 0.03        # assumed per-frame score spread while n is tiny
+AGG_FULL_SIZE = 112.0       # face width (px) that gets full weight: the aligned crop size
+AGG_NORM_REF = 20.0         # raw ArcFace embedding norm that gets full weight
+
+Decision = namedtuple("Decision", ["state", "match", "mean", "lower", "upper", "frames"])
+
+def quality_weight(face):
+    """Detector confidence x face size x embedding norm, each capped at 1.
+
+    The raw (unnormalized) ArcFace norm drops for blurred, occluded and
+    badly lit faces, so it doubles as a cheap image quality score.
+    """
+    det = getattr(face, "det_score", None)
+    det = 1.0 if det is None else float(det)
+    x1, _, x2, _ = face.bbox[:4]
+    size = min(1.0, max(0.0, float(x2 - x1)) / AGG_FULL_SIZE)
+    norm = min(1.0, float(np.linalg.norm(face.embedding)) / AGG_NORM_REF)
+    return det * size * norm
+
+class EmbeddingAggregator:
+    """Quality-weighted running mean of one tracked face's embeddings,
+    with a sequential accept/reject rule.
+
+    Each frame adds its normalized embedding with a quality weight. The
+    weighted mean is matched against the gallery to pick the candidate
+    voter; every stored frame is then scored against that voter's row,
+    giving a weighted mean score and a confidence interval
+    mean +- AGG_Z standard errors. The face is accepted once the lower
+    bound clears the threshold (and the identity leads the runner-up),
+    rejected once the upper bound falls below it (after at least
+    AGG_REJECT_FRAMES), and decided on the mean after AGG_MAX_FRAMES.
+    A new track id starts over.
+    """
+
+    def __init__(self, gallery, threshold=SIM_THRESHOLD, min_frames=AGG_MIN_FRAMES,
+                 max_frames=AGG_MAX_FRAMES, z=AGG_Z, reject_frames=AGG_REJECT_FRAMES):
+        self.gallery = gallery
+        self.threshold = threshold
+        self.min_frames = min_frames
+        self.reject_frames = reject_frames
+        self.max_frames = max_frames
+        self.z = z
+        self.reset()
+
+    def reset(self):
+        self.track_id = None
+        self.embs = []
+        self.weights = []
+        self.sum = None
+        self.decision = None
+
+    def _row(self, mean, label):
+        idx, _ = self.gallery.top_k(mean, RERANK_K)
+        return next((i for i in idx if self.gallery.label(i) == label), idx[0])
+
+    def add(self, face):
+        """Feed one frame's face; returns the current Decision."""
+        track_id = getattr(face, "track_id", None)
+        if track_id is not None and track_id != self.track_id:
+            self.reset()
+            self.track_id = track_id
+        if self.decision is not None:
+            return self.decision
+
+        w = quality_weight(face)
+        if w <= 0:
+            return self._pending()
+        e = l2_normalize(np.asarray(face.embedding, dtype=np.float32))
+        self.embs.append(e)
+        self.weights.append(w)
+        self.sum = w * e if self.sum is None else self.sum + w * e
+
+        mean = l2_normalize(self.sum)
+        match = self.gallery.search(mean)
+        if match is None:
+            return self._pending()
+
+        # Per-frame cosines to the candidate's gallery row.
+        row = np.asarray(self.gallery.matrix[self._row(mean, match.label)], dtype=np.float32)
+        s = np.asarray(self.embs) @ row
+        w = np.asarray(self.weights)
+        mu = float(np.average(s, weights=w))
+        n_eff = w.sum() ** 2 / (w ** 2).sum()
+        var = max(float(np.average((s - mu) ** 2, weights=w)), AGG_STD_FLOOR ** 2)
+        half = self.z * float(np.sqrt(var / n_eff))
+        lower, upper, n = mu - half, mu + half, len(s)
+
+        leads = match.margin is None or match.margin >= AGG_MIN_MARGIN
+        state = "pending"
+        if n >= self.min_frames:
+            if lower >= self.threshold and leads:
+                state = "accept"
+            elif upper < self.threshold and n >= self.reject_frames:
+                state = "reject"
+            elif n >= self.max_frames:
+                state = "accept" if mu >= self.threshold and leads else "reject"
+        decision = Decision(state, match, mu, lower, upper, n)
+        if state != "pending":
+            self.decision = decision
+        return decision
+
+    def _pending(self):
+        return Decision("pending", None, None, None, None, len(self.embs))
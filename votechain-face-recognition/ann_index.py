@@ -0,0 +1,100 @@
+import os
+import numpy as np
+
+# ------------ CONFIG ------------
+INDEX_PATH = "face_index.npz"
+ANN_MIN_SIZE = 20000        # below this a brute-force scan is already fast
+ANN_NPROBE = 8              # inverted lists visited per query
+KMEANS_ITERS = 10
+KMEANS_SAMPLE_PER_LIST = 64
+ASSIGN_CHUNK = 65536
+
+def default_nlist(n):
+    return max(1, int(4 * np.sqrt(n)))
+
+def _assign(x, coarse):
+    out = np.empty(len(x), dtype=np.int32)
+    for s in range(0, len(x), ASSIGN_CHUNK):
+        out[s:s + ASSIGN_CHUNK] = np.argmax(x[s:s + ASSIGN_CHUNK] @ coarse.T, axis=1)
+    return out
+
+def _normalize(x):
+    return x / np.maximum(np.linalg.norm(x, axis=-1, keepdims=True), 1e-12)
+
+def spherical_kmeans(x, k, iters=KMEANS_ITERS, seed=0):
+    rng = np.random.default_rng(seed)
+    coarse = x[rng.choice(len(x), k, replace=False)].copy()
+    for _ in range(iters):
+        assign = _assign(x, coarse)
+        sums = np.zeros_like(coarse)
+        np.add.at(sums, assign, x)
+        empty = ~sums.any(axis=1)
+        # Re-seed empty lists so every list keeps a share of the gallery.
+        sums[empty] = x[rng.choice(len(x), int(empty.sum()), replace=False)]
+        coarse = _normalize(sums).astype(np.float32)
+    return coarse
+
+# ------------ INDEX ------------
+class IVFIndex:
+    """Inverted-file index over a Gallery's normalized centroid matrix.
+
+    Rows are grouped by their nearest coarse centroid; a query only scores
+    the rows in its `nprobe` closest lists. It returns candidate row ids
+    and leaves the exact cosine re-rank to the gallery, so scores compared
+    against SIM_THRESHOLD are identical to a brute-force search.
+    """
+
+    def __init__(self, labels, coarse, order, offsets):
+        self.labels = np.asarray(labels)
+        self.coarse = np.ascontiguousarray(coarse, dtype=np.float32)
+        self.order = np.asarray(order, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+    @classmethod
+    def build(cls, labels, matrix, nlist=None, seed=0):
+        matrix = np.asarray(matrix, dtype=np.float32)
+        nlist = min(nlist or default_nlist(len(matrix)), len(matrix))
+        rng = np.random.default_rng(seed)
+        sample_size = min(len(matrix), nlist * KMEANS_SAMPLE_PER_LIST)
+        sample = matrix[rng.choice(len(matrix), sample_size, replace=False)]
+        coarse = spherical_kmeans(sample, nlist, seed=seed)
+        return cls.from_coarse(labels, matrix, coarse)
+
+    @classmethod
+    def from_coarse(cls, labels, matrix, coarse):
+        """Re-bucket a (changed) gallery under an existing coarse quantizer.
+
+        One assignment pass, no k-means: used after small gallery updates.
+        """
+        matrix = np.asarray(matrix, dtype=np.float32)
+        nlist = len(coarse)
+        assign = _assign(matrix, coarse)
+        order = np.argsort(assign, kind="stable")
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=nlist), out=offsets[1:])
+        return cls(labels, coarse, order, offsets)
+
+    @property
+    def nlist(self):
+        return len(self.coarse)
+
+    def candidates(self, q, nprobe=ANN_NPROBE):
+        """Row ids of the gallery entries in the lists closest to unit query q."""
+        nprobe = min(nprobe, self.nlist)
+        lists = np.argpartition(-(self.coarse @ q), nprobe - 1)[:nprobe]
+        return np.concatenate([self.order[self.offsets[l]:self.offsets[l + 1]]
+                               for l in lists])
+
+    def matches(self, labels):
+        return len(labels) == len(self.labels) and np.array_equal(labels, self.labels)
+
+    def save(self, path=INDEX_PATH):
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, labels=self.labels, coarse=self.coarse,
+                 order=self.order, offsets=self.offsets)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=INDEX_PATH):
+        with np.load(path) as z:
+            return cls(z["labels"], z["coarse"], z["order"], z["offsets"])
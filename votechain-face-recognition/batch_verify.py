@@ -0,0 +1,265 @@
+"""Run the booth session over recorded voters, in parallel, for regression runs.
+
+    python batch_verify.py sessions/ --json results.json --csv results.csv
+    python batch_verify.py sessions/ --mode sequential --threshold 0.45 --truth truth.csv
+
+Every video file in the directory (and every subdirectory of numbered
+images, read as one image sequence) is one session. Each goes through
+face_rec_demo.run_session headless, exactly as at the booth: wait for a
+face, blink, head turn, recognition. Worker processes load the models
+once and then take sessions off a shared queue.
+
+Per session the output has the decision, matched label and score, the
+stage timings from run_session (wall seconds), how many seconds of video
+were consumed until the decision, and, with --truth, whether the
+decision was correct. A session without a decision after --session-limit
+wall seconds is aborted and reported as an error. The truth CSV has "session,label" rows, where
+session is the file or folder name (extension optional) and an empty
+label means the session must be rejected (impostor, spoof).
+"""
+import argparse
+import csv
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from multiprocessing import Pool, TimeoutError
+
+import face_rec_demo as frd
+from camera import FrameGrabber
+from metrics import metrics
+
+# ------------ CONFIG ------------
+VIDEO_EXTS = (".mp4", ".avi", ".mkv", ".mov", ".webm")
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+STAGES = ("time_to_face", "time_to_blinks", "time_to_liveness",
+          "time_to_identity", "time_to_decision")
+SESSION_SLACK = 60.0        # default --session-limit: --timeout plus this (idle wait, liveness)
+SESSION_GRACE = 10.0        # extra wait for a worker that ignores the abort
+FIELDS = ("session", "mode", "result", "label", "score", "margin", "expected",
+          "correct") + STAGES + ("video_time", "frames", "elapsed", "error")
+
+# ------------ SESSIONS ------------
+def image_sequence(folder):
+    """cv2.VideoCapture pattern (img_%04d.jpg) for a folder of numbered images."""
+    names = sorted(n for n in os.listdir(folder) if n.lower().endswith(IMAGE_EXTS))
+    if not names:
+        return None
+    stem, ext = os.path.splitext(names[0])
+    digits = len(stem) - len(stem.rstrip("0123456789"))
+    if not digits:
+        return None
+    return os.path.join(folder, f"{stem[:-digits]}%0{digits}d{ext}")
+
+def find_sessions(root):
+    """(name, source) for every recorded session under `root`, sorted by name."""
+    if os.path.isfile(root):
+        return [(os.path.basename(root), root)]
+    sessions = []
+    for name in sorted(os.listdir(root)):
+        path = os.path.join(root, name)
+        if os.path.isdir(path):
+            pattern = image_sequence(path)
+            if pattern:
+                sessions.append((name, pattern))
+        elif name.lower().endswith(VIDEO_EXTS):
+            sessions.append((name, path))
+    return sessions
+
+def load_truth(path):
+    with open(path, newline="") as f:
+        return {row[0]: row[1] if len(row) > 1 else "" for row in csv.reader(f) if row}
+
+# ------------ WORKER ------------
+_config = {}
+
+def init_worker(config):
+    """Load the models once per process, headless, with the run's overrides."""
+    _config.update(config)
+    # Session logs go to stderr so stdout stays clean for the JSON report.
+    sys.stdout = sys.stderr
+    frd.set_display('headless')
+    frd.GALLERY_PATH = config["gallery"]
+    frd.SIM_THRESHOLD = config["threshold"]
+    frd.RECOGNITION_DURATION = config["timeout"]
+    metrics.configure(enabled=config["metrics"])
+    frd.init_models()
+
+def verify_session(item):
+    name, source = item
+    mode = _config["mode"]
+    realtime = _config["realtime"]
+    if realtime is None:
+        # The pipelined workers race the camera; a lossless reader would
+        # let them see frames the booth would have dropped.
+        realtime = mode == 'pipelined'
+    row = {"session": name, "mode": mode}
+    t0 = time.time()
+    limit = _config["session_limit"]
+    expired = threading.Event()
+
+    def watchdog():
+        expired.set()
+        frd.control.request("abort")
+    timer = threading.Timer(limit, watchdog)
+    timer.daemon = True
+    cam = FrameGrabber(source, realtime=realtime).start()
+    timer.start()
+    try:
+        if not cam.isOpened():
+            raise IOError(f"cannot open {source}")
+        frd.control.reset_abort()
+        # Each session starts from a clean idle state.
+        frd.presence.reset()
+        frd.tracker.reset()
+        result = frd.run_session(cam, mode)
+        row.update(result=result["result"], label=result.get("label"),
+                   score=result.get("score"), margin=result.get("margin"))
+        row.update(result.get("timings", {}))
+        if "metrics" in result:
+            row["metrics"] = result["metrics"]
+        row.update(video_time=cam.position(), frames=cam.cursor + 1)
+        if expired.is_set():
+            row.update(result="error", label=None, score=None, margin=None,
+                       error=f"no decision within {limit:.0f}s")
+    except Exception as e:
+        row.update(result="error", error=str(e))
+    finally:
+        timer.cancel()
+        cam.release()
+    row["elapsed"] = time.time() - t0
+    return row
+
+# ------------ REPORT ------------
+def score_rows(rows, truth):
+    for row in rows:
+        name = row["session"]
+        if name not in truth:
+            name = os.path.splitext(name)[0]
+            if name not in truth:
+                continue
+        expected = truth[name]
+        row["expected"] = expected
+        if row["result"] != "error":
+            accepted = row["result"] == "success"
+            row["correct"] = (accepted and row["label"] == expected) if expected else not accepted
+
+def write_csv(path, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({k: row.get(k) for k in FIELDS})
+
+def summarize(rows, wall):
+    decided = [r for r in rows if r["result"] == "success"]
+    summary = {
+        "sessions": len(rows),
+        "success": len(decided),
+        "failed": sum(r["result"] == "failed" for r in rows),
+        "errors": sum(r["result"] == "error" for r in rows),
+        "wall_time": wall,
+        "sessions_per_minute": 60.0 * len(rows) / wall if wall > 0 else None,
+    }
+    scored = [r["correct"] for r in rows if r.get("correct") is not None]
+    if scored:
+        summary["accuracy"] = sum(scored) / len(scored)
+    for stage in STAGES + ("video_time",):
+        values = [r[stage] for r in decided if r.get(stage) is not None]
+        if values:
+            summary[stage] = {"mean": statistics.mean(values),
+                              "median": statistics.median(values),
+                              "max": max(values)}
+    return summary
+
+def _fmt(value, spec):
+    return "-" if value is None else format(value, spec)
+
+def print_table(rows, summary):
+    print(f"{'session':<28} {'result':<8} {'label':<14} {'score':>6} "
+          f"{'liveness':>9} {'decision':>9} {'video':>7}", file=sys.stderr)
+    for r in rows:
+        mark = {True: "", False: " WRONG"}.get(r.get("correct"), "")
+        print(f"{r['session'][:28]:<28} {r['result']:<8} {str(r.get('label') or '-')[:14]:<14} "
+              f"{_fmt(r.get('score'), '6.2f'):>6} {_fmt(r.get('time_to_liveness'), '8.2f'):>9} "
+              f"{_fmt(r.get('time_to_decision'), '8.2f'):>9} "
+              f"{_fmt(r.get('video_time'), '6.2f'):>7}{mark}", file=sys.stderr)
+    line = (f"{summary['success']}/{summary['sessions']} accepted, "
+            f"{summary['errors']} errors, {summary['wall_time']:.1f}s wall, "
+            f"{summary['sessions_per_minute'] or 0:.1f} sessions/min")
+    if "accuracy" in summary:
+        line += f", accuracy {summary['accuracy']:.3f}"
+    if "time_to_decision" in summary:
+        line += f", median decision {summary['time_to_decision']['median']:.2f}s"
+    print(line, file=sys.stderr)
+
+# ------------ MAIN ------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("sessions", help="directory of recorded sessions, or one video")
+    parser.add_argument("--mode", choices=["pipelined", "sequential"], default=frd.SESSION_MODE)
+    parser.add_argument("--gallery", default=frd.GALLERY_PATH)
+    parser.add_argument("--threshold", type=float, default=frd.SIM_THRESHOLD)
+    parser.add_argument("--timeout", type=float, default=frd.RECOGNITION_DURATION,
+                        help="seconds of recognition before a FAILED decision")
+    parser.add_argument("--session-limit", type=float,
+                        help="wall seconds before a session is aborted as an error "
+                             f"(default: --timeout + {SESSION_SLACK:.0f})")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    playback = parser.add_mutually_exclusive_group()
+    playback.add_argument("--realtime", dest="realtime", action="store_true", default=None,
+                          help="play at the recorded FPS (default for pipelined)")
+    playback.add_argument("--fast", dest="realtime", action="store_false",
+                          help="feed every frame as fast as it is processed "
+                               "(default for sequential)")
+    parser.add_argument("--truth", help="CSV of session,expected_label")
+    parser.add_argument("--metrics", action="store_true",
+                        help="add per-stage latency histograms to each session in the JSON")
+    parser.add_argument("--json", help="write per-session results and summary here")
+    parser.add_argument("--csv", help="write per-session results here")
+    args = parser.parse_args(argv)
+
+    sessions = find_sessions(args.sessions)
+    if not sessions:
+        print("[ERROR] No recorded sessions in", args.sessions)
+        return 2
+    config = {"mode": args.mode, "gallery": args.gallery, "threshold": args.threshold,
+              "timeout": args.timeout, "realtime": args.realtime, "metrics": args.metrics,
+              "session_limit": args.session_limit or args.timeout + SESSION_SLACK}
+    workers = min(args.workers, len(sessions))
+    print(f"[INFO] {len(sessions)} sessions, {workers} workers, mode {args.mode}",
+          file=sys.stderr)
+
+    t0 = time.time()
+    with Pool(workers, initializer=init_worker, initargs=(config,)) as pool:
+        jobs = [(item, pool.apply_async(verify_session, (item,))) for item in sessions]
+        rows = []
+        for (name, _), job in jobs:
+            try:
+                rows.append(job.get(timeout=config["session_limit"] + SESSION_GRACE))
+            except TimeoutError:
+                # The worker did not come back even after the abort; the
+                # pool is terminated on exit.
+                rows.append({"session": name, "mode": args.mode, "result": "error",
+                             "error": "worker hung after the session limit"})
+    wall = time.time() - t0
+
+    if args.truth:
+        score_rows(rows, load_truth(args.truth))
+    summary = summarize(rows, wall)
+    print_table(rows, summary)
+    if args.csv:
+        write_csv(args.csv, rows)
+    report = {"config": config, "summary": summary, "sessions": rows}
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if not args.json and not args.csv:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
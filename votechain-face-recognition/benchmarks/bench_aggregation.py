@@ -0,0 +1,103 @@
+"""Frames to a decision and decision outcome: single-frame rule vs EmbeddingAggregator.
+
+    python -m benchmarks.bench_aggregation                      # simulated voters
+    python -m benchmarks.bench_aggregation sessions/*.mp4 --gallery face_gallery.bin
+
+"single" is the previous recognize() rule: accept the first frame at or
+above SIM_THRESHOLD, otherwise keep going until the frames run out (the
+timeout). "aggregate" is EmbeddingAggregator's sequential accept/reject.
+Simulated voters draw per-frame cosines around a true similarity with
+frame-to-frame noise; videos go through FaceTracker like the booth does.
+"""
+import argparse
+import statistics
+from collections import namedtuple
+
+import numpy as np
+
+from aggregation import EmbeddingAggregator, SIM_THRESHOLD
+from gallery import Gallery
+
+DIM = 512
+SimFace = namedtuple("SimFace", ["bbox", "embedding", "det_score", "track_id"])
+
+def simulated(rng, center, sim, frames, noise=0.08):
+    faces = []
+    for _ in range(frames):
+        n = rng.normal(size=DIM)
+        n -= n.dot(center) * center
+        n /= np.linalg.norm(n)
+        s = float(np.clip(sim + rng.normal(0, noise), -1, 1))
+        emb = (s * center + np.sqrt(1 - s * s) * n) * rng.uniform(14, 26)
+        faces.append(SimFace(np.array([0, 0, rng.uniform(80, 200), 200.0]), emb,
+                             rng.uniform(0.6, 0.95), 1))
+    return faces
+
+def single(gallery, faces):
+    for i, face in enumerate(faces, 1):
+        best = gallery.search(face.embedding)
+        if best and best.score >= SIM_THRESHOLD:
+            return "accept", i
+    return "timeout", len(faces)
+
+def aggregate(gallery, faces):
+    agg = EmbeddingAggregator(gallery, SIM_THRESHOLD)
+    for i, face in enumerate(faces, 1):
+        decision = agg.add(face)
+        if decision.state != "pending":
+            return decision.state, i
+    return "timeout", len(faces)
+
+def video_faces(path, tracker, limit):
+    import cv2
+
+    cap = cv2.VideoCapture(path)
+    tracker.reset()
+    faces = []
+    while len(faces) < limit:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        faces.extend(tracker.get(frame))
+    cap.release()
+    return faces
+
+def report(name, rows):
+    states = [s for s, _ in rows]
+    counts = ", ".join(f"{s} {states.count(s)}" for s in sorted(set(states)))
+    print(f"  {name:<10} frames median {statistics.median(n for _, n in rows):5.1f}  "
+          f"max {max(n for _, n in rows):4d}  {counts}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("videos", nargs="*")
+    parser.add_argument("--gallery", default="face_gallery.bin")
+    parser.add_argument("--frames", type=int, default=300, help="frames until timeout")
+    parser.add_argument("--voters", type=int, default=200)
+    parser.add_argument("--ctx", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.videos:
+        from face_models import create_face_model
+        from tracking import FaceTracker
+
+        gallery = Gallery.load(args.gallery)
+        tracker = FaceTracker(create_face_model(ctx_id=args.ctx))
+        sessions = {"videos": [video_faces(p, tracker, args.frames) for p in args.videos]}
+    else:
+        rng = np.random.default_rng(0)
+        rows = rng.normal(size=(1000, DIM))
+        rows /= np.linalg.norm(rows, axis=1, keepdims=True)
+        gallery = Gallery.from_centroids({str(i): r for i, r in enumerate(rows)})
+        sessions = {f"{name} (sim {sim})": [simulated(rng, rows[i % len(rows)], sim, args.frames)
+                                            for i in range(args.voters)]
+                    for name, sim in (("genuine", 0.65), ("borderline", 0.52),
+                                      ("impostor", 0.25))}
+
+    for group, faces_list in sessions.items():
+        print(group)
+        report("single", [single(gallery, f) for f in faces_list])
+        report("aggregate", [aggregate(gallery, f) for f in faces_list])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Recognition throughput vs latency with InferenceQueue micro-batching, on CPU.
+
+    python -m benchmarks.bench_batching
+    python -m benchmarks.bench_batching --clients 1 4 8 --waits 0 0.002 0.005 --batches 4 16
+
+First the raw cost of one get_feat call per batch size, then N client
+threads each embedding one crop at a time in a closed loop (a booth's
+FaceTracker) through one InferenceQueue, for every max_batch x max_wait.
+Crop content does not change the cost, so random 112x112 crops are used.
+"""
+import argparse
+import statistics
+import threading
+import time
+
+import numpy as np
+
+from face_models import create_face_model
+from inference import InferenceQueue
+
+def raw(rec, crops, sizes, repeat):
+    print(f"{'batch':>5} {'ms/call':>8} {'ms/crop':>8} {'crops/s':>8}")
+    for n in sizes:
+        batch = crops[:n]
+        rec.get_feat(batch)
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            rec.get_feat(batch)
+        call = (time.perf_counter() - t0) / repeat
+        print(f"{n:5d} {call*1000:8.2f} {call/n*1000:8.2f} {n/call:8.0f}")
+
+def closed_loop(face_model, crops, clients, max_batch, max_wait, duration):
+    inference = InferenceQueue(face_model, max_batch=max_batch, max_wait=max_wait).start()
+    proxies = [inference.proxy() for _ in range(clients)]
+    latencies = [[] for _ in range(clients)]
+    stop = time.perf_counter() + duration
+
+    def client(i):
+        rec = proxies[i].models['recognition']
+        crop = [crops[i % len(crops)]]
+        while time.perf_counter() < stop:
+            t0 = time.perf_counter()
+            rec.get_feat(crop)
+            latencies[i].append(time.perf_counter() - t0)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    inference.stop()
+    lat = sorted(x for per in latencies for x in per)
+    return (len(lat) / wall, statistics.median(lat), lat[int(0.95 * (len(lat) - 1))],
+            inference.embed_crops / max(1, inference.embed_calls))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--batches", type=int, nargs="+", default=[1, 8, 16])
+    parser.add_argument("--waits", type=float, nargs="+", default=[0.0, 0.003, 0.01])
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    face_model = create_face_model(ctx_id=-1)
+    rec = face_model.models['recognition']
+    rng = np.random.default_rng(0)
+    crops = [rng.integers(0, 256, (112, 112, 3), dtype=np.uint8) for _ in range(32)]
+
+    raw(rec, crops, [1, 2, 4, 8, 16, 32], args.repeat)
+    print(f"\n{'clients':>7} {'batch':>5} {'wait ms':>7} {'crops/s':>8} "
+          f"{'p50 ms':>7} {'p95 ms':>7} {'mean batch':>10}")
+    for clients in args.clients:
+        for max_batch in args.batches:
+            for max_wait in args.waits:
+                rate, p50, p95, mean = closed_loop(face_model, crops, clients, max_batch,
+                                                   max_wait, args.duration)
+                print(f"{clients:7d} {max_batch:5d} {max_wait*1000:7.1f} {rate:8.0f} "
+                      f"{p50*1000:7.1f} {p95*1000:7.1f} {mean:10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""Training embedding extraction throughput vs number of worker processes.
+
+    python -m benchmarks.bench_extraction --data dataset --workers 1,2,4,8,16,32
+
+The embedding cache is bypassed, so every run embeds every image. Worker
+start-up (model load) is included, as it is in a real retrain.
+"""
+import argparse
+import os
+import time
+
+import train_faces
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", default=train_faces.DATA_DIR)
+    parser.add_argument("--workers", default=f"1,2,4,{os.cpu_count()}")
+    args = parser.parse_args()
+
+    ids = sorted(d for d in os.listdir(args.data) if os.path.isdir(os.path.join(args.data, d)))
+    paths = [p for _, p in train_faces.list_images(ids, args.data)]
+    print(f"{len(paths)} images from {len(ids)} voters")
+    print(f"{'workers':>7}  {'seconds':>8}  {'img/s':>8}  {'scaling':>8}")
+
+    base = None
+    for n in map(int, args.workers.split(",")):
+        t0 = time.perf_counter()
+        for _ in train_faces.extract_embeddings(paths, workers=n):
+            pass
+        elapsed = time.perf_counter() - t0
+        rate = len(paths) / elapsed
+        base = base or rate
+        print(f"{n:>7}  {elapsed:>8.2f}  {rate:>8.1f}  {rate/base:>7.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Per-image embedding latency for each FaceAnalysis configuration.
+
+    python -m benchmarks.bench_face_models --data dataset --limit 100
+
+Compares the full buffalo_l pipeline (what training and the booth used to
+run), detection + recognition only at two detector sizes, and recognition
+alone on pre-aligned crops.
+"""
+import argparse
+import os
+import statistics
+import time
+
+import cv2
+
+import face_models
+from face_models import create_face_model, align_face, embed_aligned
+from train_faces import list_images
+
+def per_image(fn, images):
+    fn(images[0])  # warm-up
+    times = []
+    for img in images:
+        t0 = time.perf_counter()
+        fn(img)
+        times.append(time.perf_counter() - t0)
+    return times
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", default="dataset")
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--ctx", type=int, default=-1)
+    args = parser.parse_args()
+
+    ids = sorted(d for d in os.listdir(args.data) if os.path.isdir(os.path.join(args.data, d)))
+    images = [cv2.imread(p) for _, p in list_images(ids, args.data)[:args.limit]]
+    images = [img for img in images if img is not None]
+    print(f"{len(images)} images")
+
+    configs = [
+        ("full buffalo_l @640", dict(allowed_modules=None, det_size=(640, 640))),
+        ("det+rec @640", dict(det_size=(640, 640))),
+        ("det+rec @320", dict(det_size=(320, 320))),
+    ]
+    crops = []
+    for name, kw in configs:
+        app = create_face_model(ctx_id=args.ctx, **kw)
+        times = per_image(app.get, images)
+        print(f"{name:<22} mean {statistics.mean(times)*1000:7.1f} ms   "
+              f"median {statistics.median(times)*1000:7.1f} ms")
+        if not crops:
+            for img in images:
+                faces = app.get(img)
+                if faces:
+                    crops.append(align_face(img, faces[0]))
+
+    # FaceAnalysis always loads a detector; it is simply not called here.
+    app = create_face_model(ctx_id=args.ctx)
+    times = per_image(lambda crop: embed_aligned(app, [crop]), crops)
+    print(f"{'rec only, aligned':<22} mean {statistics.mean(times)*1000:7.1f} ms   "
+          f"median {statistics.median(times)*1000:7.1f} ms   "
+          f"({face_models.ALIGNED_SIZE}px crops)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Per-query matching time: dict-of-centroids loop vs Gallery matrix search.
+
+    python -m benchmarks.bench_gallery --sizes 1000,100000,1000000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from gallery import Gallery
+
+DIM = 512
+
+def legacy_search(centroids, emb):
+    sims = {lbl: emb.dot(c)/(np.linalg.norm(emb)*np.linalg.norm(c))
+            for lbl,c in centroids.items()}
+    return max(sims.items(), key=lambda x: x[1])
+
+def time_per_query(fn, queries):
+    t0 = time.perf_counter()
+    for q in queries:
+        fn(q)
+    return (time.perf_counter() - t0) / len(queries)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,100000,1000000")
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--legacy-max", type=int, default=100000,
+                        help="skip the dict loop above this gallery size")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'N':>9}  {'dict loop':>12}  {'matrix':>12}  {'speedup':>8}")
+    for n in map(int, args.sizes.split(",")):
+        matrix = rng.standard_normal((n, DIM), dtype=np.float32)
+        labels = np.array([f"{1000000000 + i}" for i in range(n)])
+        queries = matrix[rng.integers(0, n, args.queries)] \
+            + 0.3 * rng.standard_normal((args.queries, DIM), dtype=np.float32)
+
+        gallery = Gallery(labels, matrix / np.linalg.norm(matrix, axis=1, keepdims=True))
+        fast = time_per_query(gallery.search, queries)
+
+        if n <= args.legacy_max:
+            centroids = dict(zip(labels, matrix))
+            slow = time_per_query(lambda q: legacy_search(centroids, q), queries)
+            print(f"{n:>9}  {slow*1000:>9.2f} ms  {fast*1000:>9.3f} ms  {slow/fast:>7.1f}x")
+        else:
+            print(f"{n:>9}  {'-':>12}  {fast*1000:>9.3f} ms  {'-':>8}")
+        del matrix, gallery
+
+if __name__ == "__main__":
+    main()
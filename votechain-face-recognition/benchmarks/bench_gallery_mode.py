@@ -0,0 +1,63 @@
+"""Training and per-query cost of 'centroid' vs 'classifier' gallery mode.
+
+    python -m benchmarks.bench_gallery_mode --voters 50,100,200
+
+Centroid mode trains nothing beyond the per-voter sums. Classifier mode
+fits the SGDClassifier over every sample and re-ranks the RERANK_K best
+cosine candidates at query time.
+"""
+import argparse
+import time
+
+import numpy as np
+from sklearn.linear_model import SGDClassifier
+
+import train_faces
+from gallery import Gallery, ClassifierReranker
+
+DIM = 512
+SAMPLES = 10
+
+def per_query(gallery, queries, batch):
+    t0 = time.perf_counter()
+    for s in range(0, len(queries), batch):
+        gallery.search_batch(queries[s:s + batch])
+    return (time.perf_counter() - t0) / len(queries)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--voters", default="50,100,200")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=8)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'voters':>7}  {'fit':>9}  {'centroid q':>11}  {'classifier q':>13}  "
+          f"{'agree':>6}")
+    for n in map(int, args.voters.split(",")):
+        centres = rng.standard_normal((n, DIM), dtype=np.float32) * 5
+        X = np.repeat(centres, SAMPLES, 0) + 3 * rng.standard_normal((n * SAMPLES, DIM), dtype=np.float32)
+        y = np.repeat([f"{1000000000 + i}" for i in range(n)], SAMPLES)
+        queries = centres[rng.integers(0, n, args.queries)] \
+            + 3 * rng.standard_normal((args.queries, DIM), dtype=np.float32)
+
+        sums = train_faces.voter_sums(X, y)
+        labels = sorted(sums)
+        gallery = Gallery.from_sums(labels, [sums[l][0] for l in labels],
+                                    [sums[l][1] for l in labels])
+        centroid_q = per_query(gallery, queries, args.batch)
+        plain = [m.label for m in gallery.search_batch(queries)]
+
+        t0 = time.perf_counter()
+        clf = SGDClassifier(loss='log_loss', max_iter=train_faces.CLF_MAX_ITER).fit(X, y)
+        fit = time.perf_counter() - t0
+        gallery.reranker = ClassifierReranker.from_classifier(clf)
+        classifier_q = per_query(gallery, queries, args.batch)
+        reranked = [m.label for m in gallery.search_batch(queries)]
+
+        agree = np.mean([a == b for a, b in zip(plain, reranked)])
+        print(f"{n:>7}  {fit:>7.2f} s  {centroid_q*1000:>8.3f} ms  {classifier_q*1000:>10.3f} ms  "
+              f"{agree:>6.1%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Time to apply one enrolment, one re-enrolment and one removal vs gallery size.
+
+    python -m benchmarks.bench_gallery_update --sizes 1000,100000,1000000
+
+"rebuild" is the previous approach: re-average every centroid through a
+Python dict and rebuild the matrix. "update" is Gallery.updated() from
+per-voter sums and counts. Both include writing face_gallery.bin.
+"""
+import argparse
+import os
+import tempfile
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from gallery import Gallery
+
+DIM = 512
+SAMPLES = 10
+
+def rebuild(centroids, X, y):
+    buckets = defaultdict(list)
+    for lbl, cent in centroids.items():
+        buckets[lbl].append(cent)
+    for emb, lbl in zip(X, y):
+        buckets[lbl].append(emb)
+    return Gallery.from_centroids({lbl: np.mean(e, axis=0) for lbl, e in buckets.items()})
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,100000,1000000")
+    parser.add_argument("--rebuild-max", type=int, default=100000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    path = os.path.join(tempfile.mkdtemp(), "face_gallery.bin")
+    print(f"{'N':>9}  {'rebuild':>10}  {'update':>10}")
+    for n in map(int, args.sizes.split(",")):
+        labels = [f"{1000000000 + i}" for i in range(n)]
+        sums = rng.standard_normal((n, DIM), dtype=np.float32) * SAMPLES
+        Gallery.from_sums(labels, sums, np.full(n, SAMPLES)).save(path)
+        gallery = Gallery.open(path)
+
+        new = rng.standard_normal((SAMPLES, DIM), dtype=np.float32)
+        t0 = time.perf_counter()
+        gallery.updated({"2000000000": (new.sum(0), SAMPLES), labels[n // 2]: (new.sum(0), SAMPLES)},
+                        remove=[labels[0]]).save(path + ".new")
+        update = time.perf_counter() - t0
+
+        if n <= args.rebuild_max:
+            centroids = gallery.centroids()
+            del centroids[labels[0]], centroids[labels[n // 2]]
+            X = np.concatenate([new, new])
+            y = ["2000000000"] * SAMPLES + [labels[n // 2]] * SAMPLES
+            t0 = time.perf_counter()
+            rebuild(centroids, X, y).save(path + ".new")
+            print(f"{n:>9}  {(time.perf_counter() - t0)*1000:>7.1f} ms  {update*1000:>7.1f} ms")
+        else:
+            print(f"{n:>9}  {'-':>10}  {update*1000:>7.1f} ms")
+        del gallery
+
+if __name__ == "__main__":
+    main()
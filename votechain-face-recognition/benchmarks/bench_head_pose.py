@@ -0,0 +1,103 @@
+"""Per-frame yaw cost and agreement: cold solvePnP vs cached/warm-started PnP vs geometry.
+
+    python -m benchmarks.bench_head_pose                        # synthetic head turns
+    python -m benchmarks.bench_head_pose --video session.mp4 --save points.npz
+    python -m benchmarks.bench_head_pose --points points.npz
+
+"cold" is the previous per-frame code: intrinsics rebuilt and solvePnP
+solved from scratch. "warm" is HeadTurnDetector.pnp_yaw (cached
+intrinsics, previous pose as the guess), "geometry" is geometric_yaw.
+Agreement is against "cold": mean/max yaw difference and how often the
+YAW_THRESH decision differs; synthetic runs also report the mean error
+against the true |yaw|. The synthetic sequence projects MODEL_POINTS
+through a slow left/right turn with some pitch, roll and pixel noise.
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+import liveness
+from liveness import MODEL_POINTS, YAW_THRESH, HeadTurnDetector, camera_intrinsics, geometric_yaw
+
+SHAPE = (480, 640, 3)
+
+def synthetic(frames, noise=0.5, seed=0):
+    rng = np.random.default_rng(seed)
+    cam_mat, _ = camera_intrinsics(SHAPE)
+    t = np.linspace(0, 4 * np.pi, frames)
+    yaw, pitch, roll = 35 * np.sin(t), 8 * np.sin(0.7 * t), 5 * np.sin(1.3 * t)
+    flip = np.diag([1.0, -1.0, -1.0])     # model is y-up and faces the camera
+    seq = []
+    for y, p, r in zip(*np.radians([yaw, pitch, roll])):
+        rot, _ = cv2.Rodrigues(np.array([p, y, r]))
+        rot = flip @ rot
+        cam = (rot @ MODEL_POINTS.T).T + (0, 0, 600)
+        pix = (cam_mat @ cam.T).T
+        seq.append(pix[:, :2] / pix[:, 2:] + rng.normal(0, noise, (6, 2)))
+    return np.array(seq), np.abs(yaw)
+
+def from_video(path):
+    face_mesh = liveness.create_face_mesh()
+    cap = cv2.VideoCapture(path)
+    seq, shape = [], SHAPE
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        shape = frame.shape
+        lm = liveness.get_landmarks(face_mesh, frame)
+        if lm is not None:
+            seq.append(lm.image_points)
+    cap.release()
+    return np.array(seq), shape
+
+def cold(points, shape):
+    cam_mat, dist = camera_intrinsics(shape)
+    ok, rvec, _ = cv2.solvePnP(MODEL_POINTS, points, cam_mat, dist)
+    rot, _ = cv2.Rodrigues(rvec)
+    return float(np.degrees(np.arcsin(np.clip(-rot[2,0], -1.0, 1.0))))
+
+def run(fn, seq, shape):
+    t0 = time.perf_counter()
+    yaws = [fn(p, shape) for p in seq]
+    return (time.perf_counter() - t0) / len(seq), np.array(yaws, dtype=np.float64)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=2000)
+    parser.add_argument("--video", help="extract image points from a recorded session")
+    parser.add_argument("--points", help="load image points saved with --save")
+    parser.add_argument("--save", help="write the image point sequence to this .npz")
+    args = parser.parse_args()
+
+    truth = None
+    if args.points:
+        with np.load(args.points) as z:
+            seq, shape = z["points"], tuple(z["shape"])
+    elif args.video:
+        seq, shape = from_video(args.video)
+    else:
+        (seq, truth), shape = synthetic(args.frames), SHAPE
+    if args.save:
+        np.savez(args.save, points=seq, shape=np.array(shape))
+    print(f"{len(seq)} frames")
+
+    head = HeadTurnDetector()
+    methods = [("cold", cold), ("warm", head.pnp_yaw),
+               ("geometry", lambda p, _: geometric_yaw(p))]
+    ref = None
+    print(f"{'method':<9} {'us/frame':>9} {'mean |d|':>9} {'max |d|':>8} {'decision':>9}"
+          + ("  truth err" if truth is not None else ""))
+    for name, fn in methods:
+        per, yaws = run(fn, seq, shape)
+        if ref is None:
+            ref = yaws
+        diff = np.abs(np.abs(yaws) - np.abs(ref))
+        agree = np.mean((np.abs(yaws) > YAW_THRESH) == (np.abs(ref) > YAW_THRESH))
+        err = f"  {np.abs(np.abs(yaws) - truth).mean():9.2f}" if truth is not None else ""
+        print(f"{name:<9} {per * 1e6:9.1f} {diff.mean():9.2f} {diff.max():8.2f} {agree:9.1%}{err}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Per-frame liveness overhead after the mesh: per-index Python loops vs one landmark array.
+
+    python -m benchmarks.bench_liveness --frames 5000
+
+"legacy" is the previous code: eye_aspect_ratio per eye, get_image_points
+for solvePnP and a third loop for the eye overlay. "array" is
+liveness.analyze_landmarks followed by draw_eyes. Landmarks are random
+points with MediaPipe's x/y/z attribute layout (478 with refine_landmarks);
+solvePnP itself is not included since both paths call it identically.
+"""
+import argparse
+import time
+from collections import namedtuple
+
+import numpy as np
+
+import liveness
+from liveness import LEFT_EYE, RIGHT_EYE, IDX
+
+NUM_LANDMARKS = 478
+SHAPE = (480, 640, 3)
+
+Point = namedtuple("Point", ["x", "y", "z"])
+
+def legacy_ear(lm, idxs, shape):
+    h, w = shape[:2]
+    pts = [(int(lm[i].x * w), int(lm[i].y * h)) for i in idxs]
+    A = np.linalg.norm(np.subtract(pts[1], pts[5]))
+    B = np.linalg.norm(np.subtract(pts[2], pts[4]))
+    C = np.linalg.norm(np.subtract(pts[0], pts[3]))
+    return (A + B) / (2.0 * C)
+
+def legacy(lm, frame):
+    shape = frame.shape
+    ear = (legacy_ear(lm, LEFT_EYE, shape) + legacy_ear(lm, RIGHT_EYE, shape)) / 2.0
+    h, w = shape[:2]
+    pts = np.array([(lm[i].x * w, lm[i].y * h) for i in IDX], dtype=np.float64)
+    for i in LEFT_EYE + RIGHT_EYE:
+        x, y = int(lm[i].x * frame.shape[1]), int(lm[i].y * frame.shape[0])
+        liveness.cv2.circle(frame, (x, y), 2, (0,255,0), -1)
+    return ear, pts
+
+def array(lm, frame):
+    res = liveness.analyze_landmarks(lm, frame.shape)
+    liveness.draw_eyes(frame, res, (0,255,0))
+    return res.ear, res.image_points
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    meshes = [[Point(*p) for p in rng.uniform(0.2, 0.8, (NUM_LANDMARKS, 3))]
+              for _ in range(64)]
+    frame = np.zeros(SHAPE, dtype=np.uint8)
+
+    for lm in meshes:
+        (e1, p1), (e2, p2) = legacy(lm, frame), array(lm, frame)
+        assert abs(e1 - e2) < 1e-6 and np.allclose(p1, p2, atol=1e-3)
+
+    for name, fn in (("legacy", legacy), ("array", array)):
+        runs = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            for i in range(args.frames):
+                fn(meshes[i % len(meshes)], frame)
+            runs.append((time.perf_counter() - t0) / args.frames)
+        print(f"{name:<8} {min(runs) * 1e6:8.1f} us/frame (best of {args.repeat})")
+
+if __name__ == "__main__":
+    main()
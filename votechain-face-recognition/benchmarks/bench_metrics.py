@@ -0,0 +1,36 @@
+"""Cost of the stage instrumentation, disabled vs enabled.
+
+    python -m benchmarks.bench_metrics
+
+A liveness frame goes through roughly a dozen stage()/observe() calls;
+compare the per-call cost with the ~5-30 ms the frame itself takes.
+"""
+import argparse
+import time
+
+from metrics import Metrics
+
+def per_call(metrics, calls):
+    t0 = time.perf_counter()
+    for _ in range(calls):
+        with metrics.stage("mesh"):
+            pass
+    stage = (time.perf_counter() - t0) / calls
+    t0 = time.perf_counter()
+    for _ in range(calls):
+        metrics.observe("frame_age", 0.004)
+    observe = (time.perf_counter() - t0) / calls
+    return stage, observe
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200000)
+    args = parser.parse_args()
+
+    for name, metrics in (("disabled", Metrics(enabled=False)), ("enabled", Metrics(enabled=True))):
+        stage, observe = per_call(metrics, args.calls)
+        print(f"{name:<9} stage() {stage*1e9:7.0f} ns   observe() {observe*1e9:7.0f} ns   "
+              f"12 calls/frame {12*max(stage, observe)*1e6:6.2f} us")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Load test: N simulated booths on one recognition host.
+
+    python -m benchmarks.bench_multi_booth sessions/*.mp4 --streams 1 2 4 8
+
+Each booth plays one of the videos (cycled when N exceeds them) at its
+recorded frame rate, like a camera, through multi_booth.Booth with a
+shared InferenceQueue and no serial port. For every N it reports
+per-stream idle / liveness / recognition FPS and decision latency, and
+how the shared queue batched embeddings.
+"""
+import argparse
+import statistics
+import time
+
+from display import Control, Display
+from face_models import create_face_model
+from gallery import Gallery
+from inference import InferenceQueue
+from metrics import metrics
+from multi_booth import Booth
+
+def run(n, videos, face_model, gallery, timeout):
+    control = Control()
+    display = Display(control, mode='headless')
+    inference = InferenceQueue(face_model).start()
+    metrics.configure(enabled=True)
+    metrics.session_report()
+    booths = [Booth(f"booth{i + 1}", videos[i % len(videos)], inference.proxy(), gallery,
+                    control, display=display, realtime=True, timeout=timeout, cooldown=0.0)
+              for i in range(n)]
+    t0 = time.time()
+    for b in booths:
+        b.start()
+    for b in booths:
+        b.join()
+    wall = time.time() - t0
+    inference.stop()
+    return booths, inference, metrics.session_report(), wall
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("videos", nargs="+")
+    parser.add_argument("--streams", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--gallery", default="face_gallery.bin")
+    parser.add_argument("--timeout", type=float, default=20.0)
+    parser.add_argument("--ctx", type=int, default=0)
+    args = parser.parse_args()
+
+    face_model = create_face_model(ctx_id=args.ctx)
+    gallery = Gallery.load(args.gallery)
+
+    fmt = lambda v: f"{v:6.2f}" if v is not None else "     -"
+    for n in args.streams:
+        booths, inference, report, wall = run(n, args.videos, face_model, gallery, args.timeout)
+        print(f"\n{n} stream(s), {wall:.1f}s wall")
+        print(f"  {'booth':<8} {'idle fps':>8} {'live fps':>8} {'recog fps':>9} "
+              f"{'sessions':>8} {'ok':>3} {'median s':>8} {'max s':>6}")
+        for b in booths:
+            s = b.stats()
+            print(f"  {s['booth']:<8} {s['idle_fps']:8.1f} {s['liveness_fps']:8.1f} "
+                  f"{s['recognition_fps']:9.1f} {s['sessions']:8d} {s['success']:3d} "
+                  f"{fmt(s['decision_median']):>8} {fmt(s['decision_max']):>6}")
+        live = [b.stats()["liveness_fps"] for b in booths]
+        batch = inference.embed_crops / inference.embed_calls if inference.embed_calls else 0.0
+        wait = report.get("infer_wait", {})
+        print(f"  liveness fps median {statistics.median(live):.1f}, "
+              f"{inference.requests} model requests, "
+              f"mean embed batch {batch:.2f}, "
+              f"queue wait p50 {wait.get('p50_ms', 0):.1f} ms p95 {wait.get('p95_ms', 0):.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""CPU utilization of the idle "waiting for face" loop: full pipeline vs presence gating.
+
+    python -m benchmarks.bench_presence --source 0 --seconds 30
+    python -m benchmarks.bench_presence --source empty_booth.mp4
+
+Runs the idle loop for a fixed time without a window and reports process
+CPU time per wall-clock second (1.0 = one core busy), frames seen and how
+often the detector ran. Point it at an empty booth to measure the cost
+between voters.
+"""
+import argparse
+import time
+
+from camera import FrameGrabber
+from face_models import create_face_model
+from presence import PresenceDetector
+
+def idle(cam, check, seconds):
+    frames = hits = 0
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    while time.perf_counter() - wall0 < seconds:
+        ret, frame = cam.read()
+        if not ret:
+            if not cam.isOpened():
+                break
+            continue
+        frames += 1
+        hits += bool(check(frame))
+    wall = time.perf_counter() - wall0
+    return (time.process_time() - cpu0) / wall, frames, hits
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--source", default="0")
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--ctx", type=int, default=-1)
+    args = parser.parse_args()
+    source = int(args.source) if args.source.isdigit() else args.source
+
+    face_model = create_face_model(ctx_id=args.ctx)
+    presence = PresenceDetector(face_model)
+    modes = [("full get()", face_model.get), ("presence", presence.check)]
+
+    print(f"{'mode':<12} {'cpu/s':>7} {'frames':>7} {'face':>6} {'detector':>9}")
+    for name, check in modes:
+        with FrameGrabber(source, realtime=True) as cam:
+            cpu, frames, hits = idle(cam, check, args.seconds)
+        runs = presence.detections if check == presence.check else frames
+        print(f"{name:<12} {cpu:7.2f} {frames:7d} {hits:6d} {runs:9d}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Face mesh throughput: full frame vs a tracked face ROI, on a recorded session.
+
+    python -m benchmarks.bench_roi session.mp4 --limit 600
+
+Each mode gets its own FaceMesh (they keep tracking state) and sees the
+same decoded frames. Reports mesh time per frame and the FPS it allows,
+how often the ROI lost the face and had to retry full-frame, and how far
+the ROI landmarks are from the full-frame ones (solvePnP points in pixels,
+EAR).
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+import liveness
+
+def load_frames(path, limit):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < limit:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+def run(process, frames):
+    out = []
+    t0 = time.perf_counter()
+    for frame in frames:
+        out.append(process(frame))
+    return (time.perf_counter() - t0) / len(frames), out
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("video")
+    parser.add_argument("--limit", type=int, default=600)
+    args = parser.parse_args()
+
+    frames = load_frames(args.video, args.limit)
+    h, w = frames[0].shape[:2]
+    print(f"{len(frames)} frames at {w}x{h}")
+
+    full_mesh = liveness.create_face_mesh()
+    full_t, full = run(lambda f: liveness.get_landmarks(full_mesh, f), frames)
+    tracker = liveness.LandmarkTracker(liveness.create_face_mesh())
+    roi_t, roi = run(tracker.process, frames)
+
+    print(f"{'mode':<6} {'ms/frame':>9} {'fps':>7} {'faces':>6}")
+    for name, t, res in (("full", full_t, full), ("roi", roi_t, roi)):
+        found = sum(lm is not None for lm in res)
+        print(f"{name:<6} {t * 1000:9.2f} {1 / t:7.1f} {found:6d}")
+    print(f"roi full-frame retries: {tracker.fallbacks}")
+
+    both = [(a, b) for a, b in zip(full, roi) if a is not None and b is not None]
+    if both:
+        px = np.array([np.abs(a.image_points - b.image_points).max() for a, b in both])
+        ear = np.array([abs(a.ear - b.ear) for a, b in both])
+        print(f"pose points |d| px: mean {px.mean():.2f} max {px.max():.2f}   "
+              f"EAR |d|: mean {ear.mean():.4f} max {ear.max():.4f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Cost of SerialManager.send_auth_result() on the caller's thread, and delivery.
+
+    python -m benchmarks.bench_serial
+    python -m benchmarks.bench_serial --results 200 --ack
+
+Sends --results auth results to a serial_sim.ControllerSim on a pty
+(POSIX only) in three conditions: controller up, controller re-plugged
+every 25 lines, and controller missing for the first half second.
+Reports the per-call latency seen by the booth loop and how many results
+arrived. A line caught by a hangup is written again after the
+reconnect, so a few can arrive twice (at-least-once delivery). With an
+--interval too short for SERIAL_QUEUE_SIZE to cover an outage, the
+queue drops its oldest lines instead.
+"""
+import argparse
+import statistics
+import time
+
+import serial_manager
+from serial_manager import SerialManager
+from serial_sim import ControllerSim
+
+LINK = "/tmp/votechain-bench-serial"
+
+def run(name, n, ack, interval, hangup_after=0, late=0.0):
+    sim = ControllerSim(LINK, ack=ack, hangup_after=hangup_after, hangup_for=0.5)
+    if not late:
+        sim.start()
+    ser = SerialManager(LINK, require_ack=ack, ack_timeout=0.2)
+    ser.open()
+    calls = []
+    t0 = time.perf_counter()
+    for i in range(n):
+        if late and sim.thread is None and time.perf_counter() - t0 > late:
+            sim.start()
+        t = time.perf_counter()
+        ser.send_auth_result(i % 2 == 0)
+        calls.append(time.perf_counter() - t)
+        time.sleep(interval)
+    if sim.thread is None:
+        sim.start()
+    ser.close(drain_timeout=10.0)
+    sim.stop()
+    calls.sort()
+    print(f"{name:<10} {statistics.median(calls)*1e6:8.1f} {calls[-1]*1e6:8.1f} "
+          f"{len(sim.received):9d}/{n:<4d} {ser.stats['reconnects']:5d} "
+          f"{ser.stats['retries']:7d} {ser.stats['dropped']:7d}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--results", type=int, default=100)
+    parser.add_argument("--interval", type=float, default=0.05,
+                        help="seconds between results (a real booth: several)")
+    parser.add_argument("--ack", action="store_true", help="controller acks, manager requires it")
+    args = parser.parse_args()
+
+    serial_manager.SERIAL_BACKOFF = (0.05, 0.5)
+    print(f"{'condition':<10} {'p50 us':>8} {'max us':>8} {'received':>14} {'recon':>5} "
+          f"{'retries':>7} {'dropped':>7}")
+    run("up", args.results, args.ack, args.interval)
+    run("replugged", args.results, args.ack, args.interval, hangup_after=25)
+    run("late", args.results, args.ack, args.interval, late=0.5)
+
+if __name__ == "__main__":
+    main()
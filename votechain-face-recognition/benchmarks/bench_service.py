@@ -0,0 +1,72 @@
+"""Per-verification wall time: cold spawn vs warm recognition service.
+
+Run from votechain-face-recognition/ with the service stopped:
+    python -m benchmarks.bench_service --image dataset/<nid>/<nid>_1.jpg
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+import face_service
+
+def time_cold(image, runs):
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "face_rec_demo.py", "--no-daemon", "--image", image],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - t0)
+    return times
+
+def time_warm_client(image, runs):
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "face_rec_demo.py", "--image", image],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - t0)
+    return times
+
+def time_warm_request(image, runs):
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        face_service.request({"cmd": "verify", "image": image})
+        times.append(time.perf_counter() - t0)
+    return times
+
+def wait_for_service(timeout=120.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            return face_service.request({"cmd": "health"})
+        except OSError:
+            time.sleep(0.5)
+    raise RuntimeError("recognition service did not come up")
+
+def summary(name, times):
+    print(f"{name:<28} mean {statistics.mean(times)*1000:9.1f} ms   "
+          f"median {statistics.median(times)*1000:9.1f} ms   n={len(times)}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--image", required=True)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    summary("cold spawn (--no-daemon)", time_cold(args.image, args.runs))
+
+    proc = subprocess.Popen([sys.executable, "face_service.py"],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_service()
+        summary("warm, one-shot client", time_warm_client(args.image, args.runs))
+        summary("warm, socket request", time_warm_request(args.image, args.runs))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Time-to-decision of the sequential vs pipelined session on recorded videos.
+
+    python -m benchmarks.bench_session sessions/*.mp4 --gallery face_gallery.bin
+
+Each video is played back at its own frame rate (FrameGrabber realtime=True)
+so inference competes with the camera the same way it does at the booth.
+"sequential" is the face_rec_demo flow without windows: wait for face,
+blinks, head turn, then recognition. "pipelined" is PipelinedSession, also
+started once a face is seen.
+"""
+import argparse
+import os
+import statistics
+import time
+
+import liveness
+from camera import FrameGrabber
+from face_models import create_face_model
+from gallery import Gallery
+from liveness import BlinkCounter, HeadTurnDetector
+from session import PipelinedSession, SIM_THRESHOLD, SESSION_TIMEOUT
+
+def wait_for_face(cam, face_model):
+    while True:
+        ret, frame = cam.read()
+        if not ret:
+            if not cam.isOpened():
+                return False
+            continue
+        if face_model.get(frame):
+            return True
+
+def sequential(cam, face_model, face_mesh, gallery, timeout):
+    t0 = time.time()
+    tracker = liveness.LandmarkTracker(face_mesh)
+    blinks, seq = BlinkCounter(), -1
+    while not blinks.done:
+        fr = cam.next(seq)
+        if fr is None:
+            if not cam.isOpened():
+                return None, time.time() - t0
+            continue
+        seq, ts, frame = fr
+        lm = tracker.process(frame)
+        blinks.update(None if lm is None else lm.ear, ts)
+
+    head = HeadTurnDetector()
+    while not head.turned:
+        ret, frame = cam.read()
+        if not ret:
+            if not cam.isOpened():
+                return None, time.time() - t0
+            continue
+        lm = tracker.process(frame)
+        if lm:
+            head.update(lm, frame.shape)
+
+    start = time.time()
+    while time.time() - start < timeout:
+        ret, frame = cam.read()
+        if not ret:
+            if not cam.isOpened():
+                break
+            continue
+        faces = face_model.get(frame)
+        best = gallery.search(faces[0].embedding) if faces else None
+        if best and best.score >= SIM_THRESHOLD:
+            return best.label, time.time() - t0
+    return None, time.time() - t0
+
+def pipelined(cam, face_model, face_mesh, gallery, timeout):
+    result = PipelinedSession(cam, face_model, face_mesh, gallery,
+                              timeout=timeout).run()
+    return result.get("label"), result["timings"]["time_to_decision"]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("videos", nargs="+")
+    parser.add_argument("--gallery", default="face_gallery.bin")
+    parser.add_argument("--timeout", type=float, default=SESSION_TIMEOUT)
+    parser.add_argument("--ctx", type=int, default=0)
+    args = parser.parse_args()
+
+    face_model = create_face_model(ctx_id=args.ctx)
+    gallery = Gallery.load(args.gallery)
+    face_mesh = liveness.create_face_mesh()
+
+    totals = {"sequential": [], "pipelined": []}
+    print(f"{'video':<28} {'sequential':>18} {'pipelined':>18}")
+    for path in args.videos:
+        row = []
+        for name, run in (("sequential", sequential), ("pipelined", pipelined)):
+            with FrameGrabber(path, realtime=True) as cam:
+                if not wait_for_face(cam, face_model):
+                    row.append("no face")
+                    continue
+                label, elapsed = run(cam, face_model, face_mesh, gallery, args.timeout)
+            if label is not None:
+                totals[name].append(elapsed)
+            row.append(f"{label or 'FAILED'} {elapsed:6.2f}s")
+        print(f"{os.path.basename(path)[:28]:<28} {row[0]:>18} {row[1]:>18}")
+
+    for name, times in totals.items():
+        if times:
+            print(f"{name:<10} decided {len(times)}/{len(args.videos)}  "
+                  f"mean {statistics.mean(times):.2f}s  median {statistics.median(times):.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Recognition FPS and decision latency: face_model.get per frame vs FaceTracker.
+
+    python -m benchmarks.bench_tracking sessions/*.mp4 --gallery face_gallery.bin
+
+Frames are decoded up front and fed as fast as each mode can process
+them, like a booth camera that always has a newer frame. FPS is frames
+processed per second; latency is the processing time until the first
+frame matches a voter at SIM_THRESHOLD (the recognize() decision rule).
+"""
+import argparse
+import statistics
+import time
+
+import cv2
+
+from face_models import create_face_model
+from gallery import Gallery
+from session import SIM_THRESHOLD
+from tracking import FaceTracker
+
+def load_frames(path, limit):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < limit:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+def run(get, frames, gallery):
+    decided = None
+    t0 = time.perf_counter()
+    for frame in frames:
+        faces = get(frame)
+        best = gallery.search(faces[0].embedding) if faces else None
+        if decided is None and best and best.score >= SIM_THRESHOLD:
+            decided = time.perf_counter() - t0
+    return len(frames) / (time.perf_counter() - t0), decided
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("videos", nargs="+")
+    parser.add_argument("--gallery", default="face_gallery.bin")
+    parser.add_argument("--limit", type=int, default=300)
+    parser.add_argument("--ctx", type=int, default=0)
+    args = parser.parse_args()
+
+    face_model = create_face_model(ctx_id=args.ctx)
+    gallery = Gallery.load(args.gallery)
+
+    fps = {"per-frame": [], "tracker": []}
+    print(f"{'video':<28} {'mode':<10} {'fps':>7} {'decision':>9} {'detector':>9}")
+    for path in args.videos:
+        frames = load_frames(path, args.limit)
+        tracker = FaceTracker(face_model)
+        for name, get in (("per-frame", face_model.get), ("tracker", tracker.get)):
+            rate, decided = run(get, frames, gallery)
+            fps[name].append(rate)
+            runs = tracker.detections if name == "tracker" else len(frames)
+            latency = f"{decided:8.2f}s" if decided is not None else "     none"
+            print(f"{path[-28:]:<28} {name:<10} {rate:7.1f} {latency:>9} {runs:9d}")
+
+    for name, rates in fps.items():
+        print(f"{name:<10} median {statistics.median(rates):.1f} fps")
+
+if __name__ == "__main__":
+    main()
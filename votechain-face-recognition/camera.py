@@ -0,0 +1,191 @@
+import threading
+import time
+from collections import deque, namedtuple
+
+import cv2
+
+from metrics import metrics
+
+# ------------ CONFIG ------------
+RING_SIZE = 8            # frames kept for consumers that want every frame
+READ_TIMEOUT = 1.0       # seconds a consumer waits for a new frame
+
+Frame = namedtuple("Frame", ["seq", "timestamp", "image"])
+
+class FrameGrabber:
+    """Owns a cv2.VideoCapture on a background thread.
+
+    The capture thread reads as fast as the source delivers and publishes
+    every frame, stamped with its capture time, into a small ring buffer.
+    Inference code never blocks on the driver: latest() returns the newest
+    frame (recognition), next() walks the buffer frame by frame (liveness)
+    and only skips frames that have already fallen out of the ring.
+
+    `source` is a camera index or a video file / image-sequence pattern.
+    For files, timestamps come from the video position so blink timing is
+    reproducible; `realtime` paces playback at the file's FPS and
+    `lossless` makes the reader wait instead of overwriting unread frames.
+
+    Lossless backpressure follows the shared cursor (moved by every
+    read), or, while any are open, the slowest reader(): a consumer that
+    must see every frame while others take latest() opens one and
+    closes it when done.
+    """
+
+    def __init__(self, source=0, ring_size=RING_SIZE, realtime=None, lossless=None):
+        self.source = source
+        self.is_file = not isinstance(source, int)
+        self.realtime = (not self.is_file) if realtime is None else realtime
+        self.lossless = self.is_file and not self.realtime if lossless is None else lossless
+        self.ring = deque(maxlen=ring_size)
+        self.cond = threading.Condition()
+        self.seq = -1
+        self.cursor = -1
+        self.readers = {}       # open FrameReader -> last seq handed to it
+        self.first_ts = None
+        self.cursor_ts = None
+        self.running = False
+        self.eof = False
+        self.cap = None
+        self.thread = None
+
+    def start(self):
+        self.cap = cv2.VideoCapture(self.source)
+        if not self.cap.isOpened():
+            self.eof = True
+            return self
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="frame-grabber", daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        fps = self.cap.get(cv2.CAP_PROP_FPS) if self.is_file else 0
+        period = 1.0 / fps if fps and fps > 0 else 1.0 / 30
+        t0 = time.time()
+        while self.running:
+            with metrics.stage("capture"):
+                ret, image = self.cap.read()
+            if not ret:
+                if self.is_file:
+                    break
+                time.sleep(0.01)
+                continue
+            if self.is_file:
+                pos = self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+                ts = t0 + (pos if pos > 0 else (self.seq + 1) * period)
+                if self.realtime:
+                    delay = ts - time.time()
+                    if delay > 0:
+                        time.sleep(delay)
+            else:
+                ts = time.time()
+            with self.cond:
+                while (self.lossless and self.running and len(self.ring) == self.ring.maxlen
+                       and self.ring[0].seq > self._slowest()):
+                    self.cond.wait(0.1)
+                self.seq += 1
+                if self.first_ts is None:
+                    self.first_ts = ts
+                self.ring.append(Frame(self.seq, ts, image))
+                self.cond.notify_all()
+        with self.cond:
+            self.eof = True
+            self.cond.notify_all()
+
+    def _slowest(self):
+        """Last seq every consumer has seen; call with self.cond held."""
+        return min(self.readers.values()) if self.readers else self.cursor
+
+    def _wait(self, pick, after, timeout, reader=None):
+        deadline = time.time() + timeout
+        with self.cond:
+            while True:
+                if self.ring and self.ring[-1].seq > after:
+                    frame = pick(after)
+                    if frame.seq > self.cursor:
+                        self.cursor, self.cursor_ts = frame.seq, frame.timestamp
+                    if reader in self.readers:
+                        self.readers[reader] = frame.seq
+                    self.cond.notify_all()
+                    return frame
+                remaining = deadline - time.time()
+                if self.eof or remaining <= 0:
+                    return None
+                self.cond.wait(remaining)
+
+    def latest(self, after=-1, timeout=READ_TIMEOUT):
+        """Newest frame with seq > after, waiting up to `timeout`; None on EOF/timeout."""
+        return self._wait(lambda _: self.ring[-1], after, timeout)
+
+    def next(self, after=-1, timeout=READ_TIMEOUT):
+        """Oldest buffered frame with seq > after, so every frame is seen
+        unless the consumer falls more than the ring size behind."""
+        return self._wait(lambda a: next(f for f in self.ring if f.seq > a), after, timeout)
+
+    def reader(self):
+        """A next() walker that lossless backpressure waits for until closed."""
+        reader = FrameReader(self)
+        with self.cond:
+            self.readers[reader] = -1
+        return reader
+
+    def _close_reader(self, reader):
+        with self.cond:
+            self.readers.pop(reader, None)
+            self.cond.notify_all()
+
+    def read(self):
+        """cv2.VideoCapture-compatible read of the newest unseen frame."""
+        frame = self.latest(self.cursor)
+        if frame is None:
+            return False, None
+        return True, frame.image
+
+    def position(self):
+        """Stream seconds up to the newest frame handed out (0 before the first)."""
+        with self.cond:
+            return 0.0 if self.cursor_ts is None else self.cursor_ts - self.first_ts
+
+    def isOpened(self):
+        with self.cond:
+            return not (self.eof and not any(f.seq > self.cursor for f in self.ring))
+
+    def release(self):
+        self.running = False
+        with self.cond:
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+        if self.cap is not None:
+            self.cap.release()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.release()
+
+class FrameReader:
+    """One consumer's walk over every frame; use as a context manager."""
+
+    def __init__(self, cam):
+        self.cam = cam
+        self.seq = -1
+
+    def next(self, timeout=READ_TIMEOUT):
+        """Oldest buffered frame after the last one returned; None on EOF/timeout."""
+        frame = self.cam._wait(lambda a: next(f for f in self.cam.ring if f.seq > a),
+                               self.seq, timeout, self)
+        if frame is not None:
+            self.seq = frame.seq
+        return frame
+
+    def close(self):
+        self.cam._close_reader(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
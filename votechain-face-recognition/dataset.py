@@ -3,23 +3,49 @@ import sys
 import cv2
 import time
 import numpy as np
-from insightface.app import FaceAnalysis
+from face_models import create_face_model, align_face, MODEL_NAME
 
 # --- CONFIGURATION ---
 CLASSIFIER_DATA_DIR = "dataset"      # root data folder
-MODEL_NAME = 'buffalo_l'           # InsightFace model
+ALIGNED_DIR = "aligned"            # per-NID subfolder of 112x112 aligned crops
+EMBEDDINGS_FILE = "embeddings.npz" # per-NID embeddings captured with the images
 CTX_ID = 0                        # CPU-only
 NUM_IMAGES = 10                    # number of images to capture
 DELAY = 0                          # seconds between captures
 DIFF_THRESH = 5000                 # L2 norm threshold on grayfaces
 
+def aligned_path(image_path):
+    """dataset/<nid>/<name>.jpg -> dataset/<nid>/aligned/<name>.png"""
+    folder, fname = os.path.split(image_path)
+    return os.path.join(folder, ALIGNED_DIR, os.path.splitext(fname)[0] + ".png")
+
+def load_embeddings(folder, model_name=MODEL_NAME):
+    """{image file name: embedding} from a voter folder's sidecar, if any."""
+    path = os.path.join(folder, EMBEDDINGS_FILE)
+    if not os.path.exists(path):
+        return {}
+    with np.load(path) as z:
+        if str(z["model"]) != model_name:
+            return {}
+        return dict(zip(z["names"].tolist(), z["embeddings"]))
+
+def save_embeddings(folder, embeddings, model_name=MODEL_NAME):
+    """Merge {image file name: embedding} into the sidecar, atomically."""
+    merged = load_embeddings(folder, model_name)
+    merged.update(embeddings)
+    names = sorted(merged)
+    tmp = os.path.join(folder, EMBEDDINGS_FILE + ".tmp.npz")
+    np.savez(tmp, model=np.array(model_name), names=np.array(names),
+             embeddings=np.stack([np.asarray(merged[n], dtype=np.float32) for n in names]))
+    os.replace(tmp, os.path.join(folder, EMBEDDINGS_FILE))
+
 def capture_faces(nid,
                   num_images=NUM_IMAGES,
                   delay=DELAY,
                   diff_thresh=DIFF_THRESH):
     # Prepare save directory
     save_dir = os.path.join(CLASSIFIER_DATA_DIR, nid)
-    os.makedirs(save_dir, exist_ok=True)
+    os.makedirs(os.path.join(save_dir, ALIGNED_DIR), exist_ok=True)
 
     # Initialize camera and model
     cam = cv2.VideoCapture(0)
@@ -27,12 +53,12 @@ def capture_faces(nid,
         print("[ERROR] Could not open camera.")
         return False
 
-    model = FaceAnalysis(name=MODEL_NAME)
-    model.prepare(ctx_id=CTX_ID)
+    model = create_face_model(ctx_id=CTX_ID)
 
     count = 0
     last_time = 0
     prev_gray = None
+    embeddings = {}
 
     print(f"[INFO] Capturing {num_images} frames for NID: {nid}")
     print("[INFO] Press 'q' to quit early.")
@@ -59,12 +85,12 @@ def capture_faces(nid,
                         gray_cmp = gray
 
                     if prev_gray is None or cv2.norm(gray_cmp, prev_gray, cv2.NORM_L2) > diff_thresh:
-                        # Annotate full frame
-                        annotated = frame.copy()
-                        cv2.rectangle(annotated, (x1, y1), (x2, y2), (0, 255, 0), 2)
-
+                        # Save the clean frame (no overlay) plus the aligned
+                        # crop, so training can skip re-detection.
                         out_path = os.path.join(save_dir, f"{nid}_{count + 1}.jpg")
-                        cv2.imwrite(out_path, annotated)
+                        cv2.imwrite(out_path, frame)
+                        cv2.imwrite(aligned_path(out_path), align_face(frame, face))
+                        embeddings[os.path.basename(out_path)] = face.embedding
                         print(f"[INFO] Saved {count + 1}/{num_images} -> {out_path}")
 
                         prev_gray = gray_cmp
@@ -93,6 +119,8 @@ def capture_faces(nid,
     finally:
         cam.release()
         cv2.destroyAllWindows()
+        if embeddings:
+            save_embeddings(save_dir, embeddings)
         print(f"[INFO] Done. {count} images saved to {save_dir}")
 
     return True
@@ -0,0 +1,153 @@
+import signal
+import sys
+import threading
+import time
+
+import cv2
+
+from metrics import metrics
+
+# ------------ CONFIG ------------
+DISPLAY_MODE = 'window'     # or 'headless': nothing is drawn, no HighGUI at all
+DISPLAY_FPS = 15            # frames rendered per second, per window
+QUIT_KEYS = (27,)           # Esc stops the program
+ABORT_KEYS = (ord('q'),)    # 'q' aborts the current session (quits when idle)
+
+class Control:
+    """Quit/abort requests for the recognition loops.
+
+    Sources are the display thread's keys, SIGINT/SIGTERM, lines on stdin
+    ("abort" / "quit") and the recognition service's "abort" command.
+    Loops poll aborted(); waits that used to be cv2.waitKey(ms) use wait().
+    """
+
+    def __init__(self):
+        self.quit = threading.Event()
+        self.abort = threading.Event()
+        self.wake = threading.Event()
+
+    def request(self, cmd):
+        if cmd == "quit":
+            self.quit.set()
+        elif cmd == "abort":
+            self.abort.set()
+        else:
+            return False
+        self.wake.set()
+        return True
+
+    def aborted(self):
+        return self.abort.is_set() or self.quit.is_set()
+
+    def reset_abort(self):
+        """Clear an abort once the session it was meant for has ended."""
+        self.abort.clear()
+        if not self.quit.is_set():
+            self.wake.clear()
+
+    def wait(self, seconds):
+        """Sleep up to `seconds`; returns True if interrupted by quit/abort."""
+        self.wake.wait(seconds)
+        return self.aborted()
+
+    def install_signal_handlers(self):
+        def handler(signum, frame):
+            self.request("quit")
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, handler)
+
+    def listen_stdin(self):
+        def read():
+            for line in sys.stdin:
+                self.request(line.strip().lower())
+        threading.Thread(target=read, name="control-stdin", daemon=True).start()
+
+class Display:
+    """All HighGUI work on one background thread, at a capped rate.
+
+    Loops hand over a frame plus overlay callables with show(); the thread
+    keeps only the newest frame per window, applies the overlays to a copy
+    (so frames shared with workers are never drawn on), and calls
+    imshow/waitKey at most DISPLAY_FPS times per second. Keys go to the
+    Control. With mode='headless' every call is a no-op, so the pipeline
+    runs without a display (CI, service without a monitor).
+
+    HighGUI calls must stay on one thread; that is fine on Windows and
+    Linux (GTK/Qt) booths.
+    """
+
+    def __init__(self, control=None, mode=DISPLAY_MODE, fps=DISPLAY_FPS):
+        self.control = control or Control()
+        self.enabled = mode != 'headless'
+        self.period = 1.0 / fps
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.closing = set()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        if self.enabled and self.thread is None:
+            self.running = True
+            self.thread = threading.Thread(target=self._run, name="display", daemon=True)
+            self.thread.start()
+        return self
+
+    def show(self, window, frame, *overlays):
+        """Queue `frame` for `window`; overlays are called as overlay(image)."""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.pending[window] = (frame, overlays)
+            self.closing.discard(window)
+
+    def close(self, window=None):
+        """Close one window, or all of them."""
+        if not self.enabled:
+            return
+        with self.lock:
+            names = [window] if window else list(self.pending) + ["*"]
+            for name in names:
+                self.pending.pop(name, None)
+                self.closing.add(name)
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+            self.thread = None
+
+    def _run(self):
+        shown = set()
+        while self.running:
+            t0 = time.perf_counter()
+            with self.lock:
+                pending, self.pending = self.pending, {}
+                closing, self.closing = self.closing, set()
+            for name in closing:
+                if name == "*":
+                    cv2.destroyAllWindows()
+                    shown.clear()
+                elif name in shown:
+                    cv2.destroyWindow(name)
+                    shown.discard(name)
+            for name, (frame, overlays) in pending.items():
+                with metrics.stage("draw"):
+                    image = frame.copy()
+                    for overlay in overlays:
+                        overlay(image)
+                    cv2.imshow(name, image)
+                shown.add(name)
+            key = cv2.waitKey(1) & 0xFF
+            if key in QUIT_KEYS:
+                self.control.request("quit")
+            elif key in ABORT_KEYS:
+                self.control.request("abort")
+            time.sleep(max(0.0, self.period - (time.perf_counter() - t0)))
+        if shown:
+            cv2.destroyAllWindows()
+
+def text(message, org, color, scale=0.8):
+    """Overlay that draws `message` at `org`."""
+    return lambda image: cv2.putText(image, message, org, cv2.FONT_HERSHEY_SIMPLEX,
+                                     scale, color, 2)
@@ -0,0 +1,89 @@
+import os
+import hashlib
+import joblib
+
+# ------------ CONFIG ------------
+CACHE_NAME = ".embedding_cache.pkl"   # stored inside the dataset folder
+HASH_CHUNK = 1 << 20
+
+def file_digest(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+class EmbeddingCache:
+    """Content-addressed store of face embeddings for the training images.
+
+    Embeddings are keyed by (sha1 of the image bytes, model name), so a
+    renamed or copied image is still a hit and a model change is a miss.
+    File paths only remember their last (mtime, size, sha1) so unchanged
+    files are not re-hashed. A stored None means "no face found", which is
+    cached too so faceless images are not re-run on every retrain.
+    """
+
+    def __init__(self, path, model_name):
+        self.path = path
+        self.model_name = model_name
+        self.files = {}
+        self.embeddings = {}
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+
+    @classmethod
+    def load(cls, data_dir, model_name):
+        cache = cls(os.path.join(data_dir, CACHE_NAME), model_name)
+        if os.path.exists(cache.path):
+            try:
+                raw = joblib.load(cache.path)
+                cache.files = raw.get('files', {})
+                cache.embeddings = raw.get('embeddings', {})
+            except Exception as e:
+                print(f"[WARN] Ignoring unreadable embedding cache {cache.path}: {e}")
+        return cache
+
+    def key(self, path):
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        entry = self.files.get(path)
+        if entry is None or entry[:2] != stamp:
+            entry = stamp + (file_digest(path),)
+            self.files[path] = entry
+            self.dirty = True
+        return entry[2], self.model_name
+
+    def get(self, path):
+        """Return (found, embedding) for an image path."""
+        key = self.key(path)
+        if key in self.embeddings:
+            self.hits += 1
+            return True, self.embeddings[key]
+        self.misses += 1
+        return False, None
+
+    def put(self, path, embedding):
+        self.embeddings[self.key(path)] = embedding
+        self.dirty = True
+
+    def prune(self):
+        """Forget files that no longer exist and embeddings nothing points to."""
+        self.files = {p: e for p, e in self.files.items() if os.path.exists(p)}
+        live = {e[2] for e in self.files.values()}
+        self.embeddings = {k: v for k, v in self.embeddings.items() if k[0] in live}
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        tmp = self.path + ".tmp"
+        joblib.dump({'files': self.files, 'embeddings': self.embeddings}, tmp)
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+    def stats(self):
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": rate,
+                "entries": len(self.embeddings)}
@@ -0,0 +1,71 @@
+import json
+import os
+import sys
+import threading
+import time
+
+# ------------ CONFIG ------------
+DEBUG_INTERVAL = 0.5        # seconds between repeats of the same [DEBUG] line
+
+class EventStream:
+    """Machine-readable session events, one JSON object per line.
+
+    Events (all carry "event" and "ts", the Unix time):
+      session_started   {"mode", "source"}   source: camera index or file path
+      face_detected     {"elapsed"}          idle loop found a face
+      liveness_passed   {"elapsed"}          blinks + head turn done
+      match             {"label", "score", "margin", "elapsed"}
+                        identity accepted; not the final decision yet
+      result            {"result", "label", "score", "margin", "timings", ...}
+                        final decision, exactly once per session
+
+    `write` is a text file object or a callable taking one line (the
+    service writes to its socket); with neither, emit() does nothing.
+    The caller gets each line as soon as it happens, so it can act on
+    "result" without waiting for the process to exit.
+    """
+
+    def __init__(self, write=None):
+        if write is not None and not callable(write):
+            f = write
+            write = lambda line: (f.write(line), f.flush())
+        self.write = write
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_fd(cls, fd):
+        """Events on an inherited file descriptor (the caller's extra pipe)."""
+        try:
+            return cls(os.fdopen(fd, "w", buffering=1, encoding="utf-8"))
+        except OSError as e:
+            print(f"[WARN] Cannot write events to fd {fd}: {e}", file=sys.stderr)
+            return cls()
+
+    @property
+    def enabled(self):
+        return self.write is not None
+
+    def emit(self, event, **fields):
+        if self.write is not None:
+            self.forward({"event": event, "ts": time.time(), **fields})
+
+    def forward(self, obj):
+        """Pass on an event that was emitted elsewhere (e.g. by the service)."""
+        if self.write is None:
+            return
+        line = json.dumps(obj) + "\n"
+        with self.lock:
+            try:
+                self.write(line)
+            except (OSError, ValueError):
+                # Reader went away; the session itself must not fail.
+                self.write = None
+
+_last_debug = {}
+
+def debug(key, message, interval=DEBUG_INTERVAL):
+    """[DEBUG] line on stderr, at most once per `interval` for each key."""
+    now = time.time()
+    if now - _last_debug.get(key, 0.0) >= interval:
+        _last_debug[key] = now
+        print("[DEBUG]", message, file=sys.stderr)
@@ -0,0 +1,67 @@
+from contextlib import contextmanager
+
+import numpy as np
+
+# ------------ CONFIG ------------
+MODEL_NAME = 'buffalo_l'
+# Only detection (bbox + 5-point kps) and the ArcFace embedding are used
+# anywhere; landmark_2d_106/landmark_3d_68/genderage are skipped.
+ALLOWED_MODULES = ['detection', 'recognition']
+# Detector input size. Booth and enrollment faces are large and close to
+# the camera, so (320, 320) is usually enough and roughly 4x cheaper.
+DET_SIZE = (640, 640)
+ALIGNED_SIZE = 112
+
+def create_face_model(ctx_id=0, det_size=DET_SIZE, allowed_modules=ALLOWED_MODULES,
+                      name=MODEL_NAME, threads=None):
+    """`threads` caps ONNX Runtime's intra-op threads per model (None: one per core)."""
+    from insightface.app import FaceAnalysis
+
+    with _session_threads(threads):
+        app = FaceAnalysis(name=name, allowed_modules=allowed_modules)
+    app.prepare(ctx_id=ctx_id, det_size=det_size)
+    return app
+
+@contextmanager
+def _session_threads(threads):
+    """insightface creates its InferenceSessions without SessionOptions (and
+    does not forward any), so default them while the models load."""
+    if not threads:
+        yield
+        return
+    import onnxruntime
+
+    init = onnxruntime.InferenceSession.__init__
+
+    def capped(self, path_or_bytes, sess_options=None, *args, **kwargs):
+        if sess_options is None:
+            sess_options = onnxruntime.SessionOptions()
+            sess_options.intra_op_num_threads = threads
+            sess_options.inter_op_num_threads = 1
+        init(self, path_or_bytes, sess_options, *args, **kwargs)
+
+    onnxruntime.InferenceSession.__init__ = capped
+    try:
+        yield
+    finally:
+        onnxruntime.InferenceSession.__init__ = init
+
+def align_face(img, face):
+    """112x112 ArcFace-aligned crop from the detector's five keypoints."""
+    return align_kps(img, face.kps)
+
+def align_kps(img, kps):
+    """Same as align_face for a bare (5, 2) keypoint array."""
+    from insightface.utils import face_align
+
+    return face_align.norm_crop(img, landmark=kps, image_size=ALIGNED_SIZE)
+
+def embed_aligned(app, crops):
+    """Run only the recognition model on already aligned crops.
+
+    Returns an (N, 512) float32 array matching `face.embedding` from
+    FaceAnalysis.get for the same crops.
+    """
+    if not len(crops):
+        return np.zeros((0, 512), dtype=np.float32)
+    return np.asarray(app.models['recognition'].get_feat(list(crops)), dtype=np.float32)
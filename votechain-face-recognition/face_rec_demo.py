@@ -1,245 +1,372 @@
 import cv2
 import time
-import numpy as np
-import joblib
-import mediapipe as mp
 import sys
-from insightface.app import FaceAnalysis
+import json
+import argparse
+from gallery import Gallery
+from face_models import create_face_model
+from camera import FrameGrabber
+from session import PipelinedSession
+from presence import PresenceDetector
+from tracking import FaceTracker
+from aggregation import EmbeddingAggregator
+from display import Control, Display, text
+from metrics import metrics
+from events import EventStream, debug
+import liveness
+from liveness import BlinkCounter, HeadTurnDetector, REQUIRED_BLINKS, draw_eyes
 
 # ------------ CONFIG ------------
-MODEL_PATH = "face_encodings.pkl"
+GALLERY_PATH = "face_gallery.bin"
+CAMERA_SOURCE = 0
 RECOGNITION_DURATION = 50.0
 SIM_THRESHOLD = 0.5
+# 'pipelined' runs liveness and recognition in parallel workers over the
+# same frames; 'sequential' is blink -> head turn -> recognition.
+SESSION_MODE = 'pipelined'
+# Waiting for a face: 'presence' = motion gating + downscaled detector
+# only, 'full' = face_model.get on every frame.
+IDLE_MODE = 'presence'
+# Recognition detects once and follows the face with optical flow,
+# re-detecting every few frames; False runs face_model.get per frame.
+RECOGNITION_TRACKING = True
+# Decide on a quality-weighted mean of the tracked face's embeddings with
+# a sequential accept/reject rule; False decides on the first frame that
+# clears SIM_THRESHOLD.
+RECOGNITION_AGGREGATE = True
 
-# Liveness thresholds
-BLINK_CLOSED_THRESH = 0.22
-BLINK_OPEN_THRESH = 0.28
-BLINK_CLOSED_FRAMES = 4
-BLINK_OPEN_FRAMES = 4
-REQUIRED_BLINKS = 3
-MIN_BLINK_DURATION = 0.1
-MAX_BLINK_DURATION = 0.8
-YAW_THRESH = 15.0
-
-# ------------ HELPERS ------------
-def safe_destroy(win):
-    try:
-        cv2.destroyWindow(win)
-    except cv2.error:
-        pass
+# ------------ DISPLAY ------------
+# All drawing happens on the display thread (or nowhere, headless); the
+# loops below only queue frames and overlays and poll `control`.
+control = Control()
+display = Display(control)
+
+def set_display(mode):
+    global display
+    display.stop()
+    display = Display(control, mode=mode)
+    return display
+
+# ------------ EVENTS ------------
+# JSON-lines progress for the caller (--events-fd); a no-op by default.
+events = EventStream()
+
+def set_events(stream):
+    global events
+    events = stream
+    return events
 
 # ------------ INIT MODELS ------------
-face_model = FaceAnalysis(name='buffalo_l')
-face_model.prepare(ctx_id=0)
-raw = joblib.load(MODEL_PATH)
-centroids = raw.get('centroids', {}) if isinstance(raw, dict) else {}
-
-mp_face = mp.solutions.face_mesh
-face_mesh = mp_face.FaceMesh(
-    static_image_mode=False,
-    max_num_faces=1,
-    refine_landmarks=True,
-    min_detection_confidence=0.5
-)
-LEFT_EYE = [33, 160, 158, 133, 153, 144]
-RIGHT_EYE = [362, 385, 387, 263, 373, 380]
-MODEL_POINTS = np.array([
-    (0.0, 0.0, 0.0),
-    (0.0, -63.6, -12.5),
-    (-43.3, 32.7, -26.0),
-    (43.3, 32.7, -26.0),
-    (-28.9, -28.9, -24.1),
-    (28.9, -28.9, -24.1)
-], dtype=np.float64)
-IDX = [1, 199, 33, 263, 61, 291]
+# Models are loaded lazily by init_models() so that the one-shot client path
+# (which hands the session to face_service.py) never pays for importing
+# insightface/mediapipe or preparing buffalo_l.
+face_model = None
+face_mesh = None
+tracker = None
+face_tracker = None
+presence = None
+gallery = Gallery.from_centroids({})
+
+def load_gallery(path=None):
+    global gallery
+    gallery = Gallery.load(path or GALLERY_PATH)
+    return gallery
+
+def init_models():
+    global face_model, face_mesh, tracker, face_tracker, presence
+    if face_model is not None:
+        return
+    face_model = create_face_model(ctx_id=0)
+    face_mesh = liveness.create_face_mesh()
+    tracker = liveness.LandmarkTracker(face_mesh)
+    face_tracker = FaceTracker(face_model)
+    presence = PresenceDetector(face_model)
+    load_gallery()
 
 # ------------ LIVENESS UTILS ------------
 def get_landmarks(frame):
-    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    res = face_mesh.process(rgb)
-    return res.multi_face_landmarks[0].landmark if res.multi_face_landmarks else None
-
-def eye_aspect_ratio(lm, idxs, shape):
-    h, w = shape[:2]
-    pts = [(int(lm[i].x * w), int(lm[i].y * h)) for i in idxs]
-    A = np.linalg.norm(np.subtract(pts[1], pts[5]))
-    B = np.linalg.norm(np.subtract(pts[2], pts[4]))
-    C = np.linalg.norm(np.subtract(pts[0], pts[3]))
-    return (A + B) / (2.0 * C)
-
-def get_image_points(lm, shape):
-    h, w = shape[:2]
-    return np.array([(lm[i].x * w, lm[i].y * h) for i in IDX], dtype=np.float64)
+    return tracker.process(frame)
 
 # ------------ LIVENESS CHECKS ------------
 def detect_blink(cam):
-    blink_count = 0
-    state = 'open'
-    closed_frames = open_frames = 0
-    blink_start = None
+    blinks = BlinkCounter()
+    with cam.reader() as frames:
+        while not control.aborted():
+            # Every frame, stamped at capture time, so blink durations are not
+            # skewed by how long inference took.
+            fr = frames.next()
+            if fr is None:
+                if not cam.isOpened():
+                    return False
+                continue
+            _, ts, frame = fr
+            t = time.perf_counter()
+            metrics.observe("frame_age", time.time() - ts)
 
-    while True:
-        ret, frame = cam.read()
-        if not ret:
-            continue
+            lm = get_landmarks(frame)
+            blinks.update(None if lm is None else lm.ear, ts)
 
-        lm = get_landmarks(frame)
-        if lm is None:
-            closed_frames = open_frames = 0
-        else:
-            ear = (eye_aspect_ratio(lm, LEFT_EYE, frame.shape) +
-                   eye_aspect_ratio(lm, RIGHT_EYE, frame.shape)) / 2.0
-            for i in LEFT_EYE + RIGHT_EYE:
-                x, y = int(lm[i].x * frame.shape[1]), int(lm[i].y * frame.shape[0])
-                cv2.circle(frame, (x, y), 2, (0,255,0), -1)
-
-            if state == 'open':
-                if ear < BLINK_CLOSED_THRESH:
-                    closed_frames += 1
-                    if closed_frames >= BLINK_CLOSED_FRAMES:
-                        state = 'closed'
-                        blink_start = time.time()
-                        closed_frames = 0
-                else:
-                    closed_frames = 0
-            else:
-                if ear > BLINK_OPEN_THRESH:
-                    open_frames += 1
-                    if open_frames >= BLINK_OPEN_FRAMES:
-                        duration = time.time() - blink_start
-                        if MIN_BLINK_DURATION < duration < MAX_BLINK_DURATION:
-                            blink_count += 1
-                        state = 'open'
-                        open_frames = 0
-                else:
-                    open_frames = 0
-
-        cv2.putText(frame, f"Blink {blink_count}/{REQUIRED_BLINKS}", (10,30),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0,255,255), 2)
-        cv2.imshow("Liveness", frame)
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            return False
-        if blink_count >= REQUIRED_BLINKS:
-            return True
+            overlays = [text(f"Blink {blinks.count}/{REQUIRED_BLINKS}", (10,30), (0,255,255))]
+            if lm is not None:
+                overlays.append(lambda img, lm=lm: draw_eyes(img, lm, (0,255,0)))
+            display.show("Liveness", frame, *overlays)
+            metrics.observe("liveness_frame", time.perf_counter() - t)
+            if blinks.done:
+                return True
+        return False
 
 def detect_head_turn(cam):
     print("[INFO] Please turn your head to the left or right")
-    while True:
+    head = HeadTurnDetector()
+    while not control.aborted():
         ret, frame = cam.read()
         if not ret:
+            if not cam.isOpened():
+                return False
             continue
 
-        cv2.putText(frame, "Turn head left/right", (10,30),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255,255,0), 2)
-
+        t = time.perf_counter()
+        overlays = [text("Turn head left/right", (10,30), (255,255,0))]
         lm = get_landmarks(frame)
         if lm:
             try:
-                for i in LEFT_EYE + RIGHT_EYE:
-                    x, y = int(lm[i].x * frame.shape[1]), int(lm[i].y * frame.shape[0])
-                    cv2.circle(frame, (x, y), 2, (255,0,0), -1)
-
-                img_pts = get_image_points(lm, frame.shape)
-                f = frame.shape[1]
-                c = (f / 2, frame.shape[0] / 2)
-                cam_mat = np.array([[f,0,c[0]],[0,f,c[1]],[0,0,1]], dtype="double")
-                dist = np.zeros((4,1))
-                ok, rvec, _ = cv2.solvePnP(MODEL_POINTS, img_pts, cam_mat, dist)
-
-                if ok:
-                    rot, _ = cv2.Rodrigues(rvec)
-                    yaw = abs(np.degrees(np.arctan2(rot[1,0], rot[0,0])))
-                    print(f"[DEBUG] Yaw: {yaw:.2f}")
-                    if yaw > YAW_THRESH:
-                        return True
+                overlays.append(lambda img, lm=lm: draw_eyes(img, lm, (255,0,0)))
+                yaw = head.update(lm, frame.shape)
+                if yaw is not None:
+                    debug("yaw", f"Yaw: {yaw:.2f}")
+                if head.turned:
+                    return True
             except Exception as e:
                 print("[ERROR] Head turn detection failed:", str(e))
+        else:
+            head.reset()
 
-        cv2.imshow("Liveness", frame)
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            return False
-
+        display.show("Liveness", frame, *overlays)
+        metrics.observe("liveness_frame", time.perf_counter() - t)
+    return False
 
 # ------------ RECOGNITION ------------
+def match(emb):
+    return gallery.search(emb)
+
+def verify_image(path):
+    """Match a single still image against the gallery (no liveness)."""
+    img = cv2.imread(path)
+    if img is None:
+        return {"result": "error", "error": f"cannot read image {path}"}
+    faces = face_model.get(img)
+    best = match(faces[0].embedding) if faces else None
+    if best and best.score >= SIM_THRESHOLD:
+        return {"result": "success", "label": best.label, "score": best.score,
+                "margin": best.margin}
+    return {"result": "failed", "score": best.score if best else None}
+
+def face_overlay(bbox, label, color, scale=0.9):
+    x1,y1,x2,y2 = bbox.astype(int)
+    def draw(img):
+        cv2.rectangle(img, (x1,y1), (x2,y2), color, 2)
+        cv2.putText(img, label, (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, scale, color, 2)
+    return draw
+
 def recognize(cam):
-    safe_destroy("Liveness")
-    cv2.namedWindow("Recognition")
+    display.close("Liveness")
+    face_tracker.reset()
+    aggregator = EmbeddingAggregator(gallery, SIM_THRESHOLD)
     start = time.time()
-    while time.time() - start < RECOGNITION_DURATION:
+    while time.time() - start < RECOGNITION_DURATION and not control.aborted():
         ret, frame = cam.read()
         if not ret:
+            if not cam.isOpened():
+                break
             continue
 
+        t = time.perf_counter()
+        overlays = []
         lm = get_landmarks(frame)
         if lm:
-            for i in LEFT_EYE + RIGHT_EYE:
-                x, y = int(lm[i].x * frame.shape[1]), int(lm[i].y * frame.shape[0])
-                cv2.circle(frame, (x, y), 2, (0,0,255), -1)
+            overlays.append(lambda img, lm=lm: draw_eyes(img, lm, (0,0,255)))
 
-        faces = face_model.get(frame)
+        if RECOGNITION_TRACKING:
+            faces = face_tracker.get(frame)
+        else:
+            with metrics.stage("detect_embed"):
+                faces = face_model.get(frame)
+        best = state = None
         if faces:
-            emb = faces[0].embedding
-            sims = {lbl: emb.dot(c)/(np.linalg.norm(emb)*np.linalg.norm(c))
-                    for lbl,c in centroids.items()}
-            if sims:
-                best_lbl, best_sim = max(sims.items(), key=lambda x: x[1])
-                recognized = best_sim >= SIM_THRESHOLD
-                label = best_lbl if recognized else "Unknown"
+            with metrics.stage("match"):
+                if RECOGNITION_AGGREGATE:
+                    decision = aggregator.add(faces[0])
+                    best, state = decision.match, decision.state
+                else:
+                    best = match(faces[0].embedding)
+                    state = "accept" if best and best.score >= SIM_THRESHOLD else "pending"
+            if best:
+                recognized = state == "accept"
+                label = f"Voter: {best.label}" if recognized else "Not recognized"
                 color = (0,255,0) if recognized else (0,0,255)
-                x1,y1,x2,y2 = faces[0].bbox.astype(int)
-                cv2.rectangle(frame, (x1,y1), (x2,y2), color, 2)
-                text = f"Voter: {label}" if recognized else "Not recognized"
-                cv2.putText(frame, text, (x1, y1-10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.9, color, 2)
-                
-                cv2.imshow("Recognition", frame)
-
-                if recognized:
-                    print("Matched ID:", label)
-                    print("Matched Name:", label)
-                    print(f"Confidence: {best_sim:.2f}")
-                    print("RESULT = SUCCESS")
-                    return True
-        else:
-            cv2.imshow("Recognition", frame)
+                overlays.append(face_overlay(faces[0].bbox, label, color))
+        display.show("Recognition", frame, *overlays)
+        metrics.observe("recognition_frame", time.perf_counter() - t)
+
+        if best and state == "accept":
+            return best
+        if state == "reject":
+            return None
+    return None
 
-        if cv2.waitKey(1) & 0xFF == ord('q'):
+# ------------ SESSION ------------
+def run_session(cam, mode=None):
+    """Wait for a face, run liveness and recognition; return a result dict.
+
+    "timings" holds seconds from the first frame with a face
+    (time_to_blinks, time_to_liveness, time_to_identity, time_to_decision)
+    plus time_to_face, the idle wait before it. With metrics enabled,
+    "metrics" holds the session's per-stage latency histograms.
+    """
+    result = _session(cam, mode or SESSION_MODE)
+    if metrics.enabled:
+        result["metrics"] = metrics.session_report()
+    return result
+
+def _session(cam, mode):
+    t0 = time.time()
+    events.emit("session_started", mode=mode, source=cam.source)
+    print("[INFO] Waiting for face...")
+    while cam.isOpened() and not control.aborted():
+        ret, frame = cam.read()
+        if not ret:
+            continue
+        if IDLE_MODE == 'presence':
+            faces = presence.check(frame)
+        else:
+            with metrics.stage("detect_embed"):
+                faces = face_model.get(frame)
+        display.show("Recognition", frame)
+        if faces:
             break
+    else:
+        return {"result": "failed", "timings": {}}
+
+    display.close("Recognition")
+    t1 = time.time()
+    events.emit("face_detected", elapsed=t1 - t0)
+    face_box = presence.bbox if IDLE_MODE == 'presence' else faces[0].bbox
+    presence.reset()
+    if mode == 'pipelined':
+        print("[INFO] Starting liveness check and recognition...")
+        result = PipelinedSession(cam, face_model, face_mesh, gallery,
+                                  threshold=SIM_THRESHOLD,
+                                  timeout=RECOGNITION_DURATION,
+                                  display=display,
+                                  face_box=face_box,
+                                  tracking=RECOGNITION_TRACKING,
+                                  aggregate=RECOGNITION_AGGREGATE,
+                                  events=events).run()
+        result["timings"]["time_to_face"] = t1 - t0
+        return result
+
+    timings = {"time_to_face": t1 - t0}
+    result = {"result": "failed", "timings": timings}
+    tracker.seed(face_box)
+    print("[INFO] Starting liveness check...")
+    if detect_blink(cam):
+        timings["time_to_blinks"] = time.time() - t1
+        print("[INFO] Starting head turn detection...")
+        if detect_head_turn(cam):
+            timings["time_to_liveness"] = time.time() - t1
+            events.emit("liveness_passed", elapsed=timings["time_to_liveness"])
+            print("[INFO] Liveness passed, starting recognition...")
+            best = recognize(cam)
+            if best:
+                timings["time_to_identity"] = time.time() - t1
+                events.emit("match", label=best.label, score=best.score, margin=best.margin,
+                            elapsed=timings["time_to_identity"])
+                result.update(result="success", label=best.label, score=best.score,
+                              margin=best.margin)
+    timings["time_to_decision"] = time.time() - t1
+    return result
+
+def parse_source(source):
+    """Camera index ("0") or path to a recorded video."""
+    if source is None:
+        return CAMERA_SOURCE
+    return int(source) if str(source).isdigit() else source
+
+def verify_local(image=None, source=None, mode=None):
+    """Cold path: load everything in this process and verify once."""
+    init_models()
+    if image:
+        return verify_image(image)
+    cam = FrameGrabber(parse_source(source)).start()
+    display.start()
+    try:
+        return run_session(cam, mode)
+    finally:
+        cam.release()
+        display.close()
+        display.stop()
+
+def report(result):
+    if result.get("metrics"):
+        print("[METRICS]", json.dumps(result["metrics"]))
+    if result.get("result") == "success":
+        print("Matched ID:", result["label"])
+        print("Matched Name:", result["label"])
+        print(f"Confidence: {result['score']:.2f}")
+        print("RESULT = SUCCESS")
+        return 0
+    if result.get("error"):
+        print("[ERROR]", result["error"])
     print("RESULT = FAILED")
-    return False
+    return 2 if result.get("result") == "error" else 1
 
 # ------------ MAIN ------------
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="One-shot face verification")
+    parser.add_argument("--image", help="verify a still image instead of the camera")
+    parser.add_argument("--source", help="camera index or recorded video file")
+    parser.add_argument("--no-daemon", action="store_true",
+                        help="always load models in-process")
+    parser.add_argument("--mode", choices=["pipelined", "sequential"],
+                        help=f"session engine (default {SESSION_MODE})")
+    parser.add_argument("--headless", action="store_true",
+                        help="no windows; abort with 'abort' on stdin or SIGINT")
+    parser.add_argument("--metrics", action="store_true",
+                        help="record per-stage latencies, printed as [METRICS] JSON")
+    parser.add_argument("--metrics-file", help="also write them as Prometheus text here")
+    parser.add_argument("--events-fd", type=int,
+                        help="write JSON-lines session events to this inherited fd")
+    args = parser.parse_args(argv)
+    if args.headless:
+        set_display('headless')
+    if args.events_fd is not None:
+        set_events(EventStream.from_fd(args.events_fd))
+    if args.metrics or args.metrics_file:
+        metrics.configure(enabled=True, prom_path=args.metrics_file)
+
     try:
-        cam = cv2.VideoCapture(0)
-        print("[INFO] Waiting for face...")
-        while cam.isOpened():
-            ret, frame = cam.read()
-            if not ret:
-                continue
-            faces = face_model.get(frame)
-            cv2.imshow("Recognition", frame)
-            if not faces and (cv2.waitKey(1) & 0xFF) == ord('q'):
-                break
-            if faces:
-                safe_destroy("Recognition")
-                print("[INFO] Starting liveness check...")
-                cv2.namedWindow("Liveness")
-                if not detect_blink(cam):
-                    break
-                print("[INFO] Starting head turn detection...")
-                if not detect_head_turn(cam):
-                    break
-                print("[INFO] Liveness passed, starting recognition...")
-                result = recognize(cam)
-                cam.release()
-                cv2.destroyAllWindows()
-                sys.exit(0 if result else 1)
-        cam.release()
-        cv2.destroyAllWindows()
-        print("RESULT = FAILED")
-        sys.exit(1)
+        result = None
+        if not args.no_daemon:
+            import face_service
+            try:
+                result = face_service.request({"cmd": "verify", "image": args.image,
+                                               "source": args.source, "mode": args.mode,
+                                               "events": events.enabled},
+                                              on_event=events.forward)
+            except face_service.ServiceUnavailable:
+                print("[INFO] Recognition service not running, loading models locally")
+            except OSError as e:
+                # The service had the request (and maybe the camera): do not
+                # start a second session here.
+                result = {"result": "error", "error": f"recognition service failed: {e}"}
+        if result is None:
+            control.install_signal_handlers()
+            control.listen_stdin()
+            result = verify_local(args.image, args.source, args.mode)
+        events.emit("result", **result)
+        sys.exit(report(result))
     except Exception as e:
+        events.emit("result", result="error", error=str(e))
         print("[ERROR]", str(e))
         print("RESULT = FAILED")
         sys.exit(2)
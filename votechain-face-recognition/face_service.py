@@ -0,0 +1,217 @@
+import json
+import socket
+import socketserver
+import threading
+import time
+import argparse
+
+import face_rec_demo as frd
+from camera import FrameGrabber
+from metrics import metrics
+from events import EventStream
+
+# ------------ CONFIG ------------
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
+CONNECT_TIMEOUT = 0.5
+SHUTDOWN_TIMEOUT = 5.0      # seconds a quit waits for the verify in progress
+
+_SHUTTING_DOWN = {"result": "error", "error": "recognition service is shutting down"}
+
+# ------------ SERVICE ------------
+class RecognitionService:
+    """Keeps buffalo_l, the face mesh and the gallery warm between voters.
+
+    Requests are JSON objects with a "cmd" key, one per line:
+      {"cmd": "verify"}                  camera session (liveness + match)
+      {"cmd": "verify", "image": path}   match a still image only
+      {"cmd": "verify", "source": path}  session on a recorded video
+      {"cmd": "verify", "mode": m}       "pipelined" or "sequential" session
+      {"cmd": "verify", "events": true}  stream session events before the reply
+      {"cmd": "abort"}                   abort the session in progress
+      {"cmd": "reload"}                  re-read the gallery from disk
+      {"cmd": "health"}                  uptime and gallery size
+      {"cmd": "metrics"}                 cumulative stage latencies (Prometheus text)
+
+    A quit (Esc in the service window, Ctrl+C) shuts the service down;
+    the verify in progress then replies with an error, not "failed".
+    """
+
+    def __init__(self):
+        # One camera, one booth: verifications are serialized.
+        self.lock = threading.Lock()
+        self.started = None
+        self.verifications = 0
+
+    def start(self):
+        t0 = time.time()
+        frd.init_models()
+        self.started = time.time()
+        print(f"[SERVICE] Models ready in {self.started - t0:.2f}s, "
+              f"{len(frd.gallery)} identities")
+
+    def handle(self, req, write=None):
+        """Reply to one request; `write` sends an extra line ahead of the reply."""
+        cmd = req.get("cmd")
+        if cmd == "verify":
+            stream = EventStream(write) if req.get("events") else None
+            return self.verify(req.get("image"), req.get("source"), req.get("mode"), stream)
+        if cmd == "abort":
+            return self.abort()
+        if cmd == "reload":
+            return self.reload()
+        if cmd == "health":
+            return self.health()
+        if cmd == "metrics":
+            return {"result": "ok", "enabled": metrics.enabled,
+                    "prometheus": metrics.prometheus()}
+        return {"result": "error", "error": f"unknown cmd {cmd!r}"}
+
+    def verify(self, image=None, source=None, mode=None, events=None):
+        with self.lock:
+            t0 = time.time()
+            if frd.control.quit.is_set():
+                return dict(_SHUTTING_DOWN)
+            frd.control.reset_abort()
+            if image:
+                result = frd.verify_image(image)
+            else:
+                # Session events go to this client's connection, as JSON
+                # lines with an "event" key ahead of the reply.
+                frd.set_events(events or EventStream())
+                cam = FrameGrabber(frd.parse_source(source)).start()
+                try:
+                    result = frd.run_session(cam, mode)
+                finally:
+                    cam.release()
+                    frd.display.close()
+                    frd.set_events(EventStream())
+                if frd.control.quit.is_set():
+                    result = dict(_SHUTTING_DOWN)
+            self.verifications += 1
+        result["elapsed"] = time.time() - t0
+        return result
+
+    def abort(self):
+        # Not under self.lock: it has to reach a verify that holds it.
+        frd.control.request("abort")
+        return {"result": "ok"}
+
+    def reload(self):
+        with self.lock:
+            frd.load_gallery()
+        return {"result": "ok", "identities": len(frd.gallery)}
+
+    def health(self):
+        return {
+            "result": "ok",
+            "uptime": time.time() - self.started,
+            "identities": len(frd.gallery),
+            "verifications": self.verifications,
+        }
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            line = line.strip()
+            if not line:
+                continue
+            with self.server.busy:
+                self.server.active += 1
+            try:
+                try:
+                    resp = self.server.service.handle(json.loads(line), self._write_line)
+                except Exception as e:
+                    resp = {"result": "error", "error": str(e)}
+                self._write_line(json.dumps(resp) + "\n")
+            finally:
+                with self.server.busy:
+                    self.server.active -= 1
+                    self.server.busy.notify_all()
+
+    def _write_line(self, line):
+        self.wfile.write(line.encode("utf-8"))
+        self.wfile.flush()
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.active = 0     # requests being handled or replied to
+        self.busy = threading.Condition()
+
+    def drain(self, timeout):
+        """Wait for in-flight replies, so a shutdown does not cut them off."""
+        with self.busy:
+            self.busy.wait_for(lambda: self.active == 0, timeout)
+
+# ------------ CLIENT ------------
+class ServiceUnavailable(ConnectionError):
+    """No recognition service is listening; nothing was sent."""
+
+def request(payload, host=SERVICE_HOST, port=SERVICE_PORT, timeout=None, on_event=None):
+    """Send one request and wait for its reply.
+
+    Event lines streamed ahead of the reply ({"event": ...}) are passed to
+    `on_event`. Raises ServiceUnavailable if no service is listening, so
+    callers can fall back to loading the models themselves; any other
+    OSError means the service took the request and then failed.
+    """
+    try:
+        sock = socket.create_connection((host, port), timeout=CONNECT_TIMEOUT)
+    except OSError as e:
+        raise ServiceUnavailable(f"no recognition service on {host}:{port}: {e}") from e
+    with sock:
+        sock.settimeout(timeout)
+        sock.sendall((json.dumps(payload) + "\n").encode("utf-8"))
+        with sock.makefile("rb") as f:
+            for line in f:
+                msg = json.loads(line)
+                if "event" not in msg:
+                    return msg
+                if on_event is not None:
+                    on_event(msg)
+    raise ConnectionError("recognition service closed the connection")
+
+# ------------ MAIN ------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Long-lived face recognition service")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--headless", action="store_true", help="never open windows")
+    parser.add_argument("--metrics", action="store_true",
+                        help="record per-stage latencies, returned with every verify")
+    parser.add_argument("--metrics-file", help="also write them as Prometheus text here")
+    args = parser.parse_args(argv)
+
+    if args.headless:
+        frd.set_display('headless')
+    if args.metrics or args.metrics_file:
+        metrics.configure(enabled=True, prom_path=args.metrics_file)
+    frd.display.start()
+    service = RecognitionService()
+    service.start()
+    server = _Server((args.host, args.port), _Handler)
+    server.service = service
+    print(f"[SERVICE] Listening on {args.host}:{args.port}")
+
+    def stop_on_quit():
+        frd.control.quit.wait()
+        server.shutdown()
+    threading.Thread(target=stop_on_quit, name="service-quit", daemon=True).start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print("\n[SERVICE] Quit requested.")
+        frd.control.request("quit")
+        server.drain(SHUTDOWN_TIMEOUT)
+        server.server_close()
+        frd.display.stop()
+        print("[SERVICE] Stopped.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+import os
+import sys
+import struct
+import time
+import numpy as np
+import joblib
+from collections import namedtuple
+
+from ann_index import IVFIndex, INDEX_PATH, ANN_NPROBE
+
+# ------------ CONFIG ------------
+GALLERY_PATH = "face_gallery.bin"
+MODEL_PATH = "face_encodings.pkl"     # training state; legacy galleries too
+RERANKER_PATH = "face_reranker.npz"   # classifier weights, 'classifier' mode only
+TOP_K = 2
+RERANK_K = 10     # cosine candidates handed to the classifier in 'classifier' mode
+SAVE_RETRIES = 5          # os.replace attempts while the old file is in use (Windows)
+SAVE_RETRY_DELAY = 0.2
+PENDING_SUFFIX = ".new"   # where save() leaves the gallery if the file stays in use
+
+# On-disk layout (little endian), every section 64-byte aligned:
+#   header   magic, version, n, dim, label_width
+#   matrix   float32 (n, dim), L2-normalized centroids
+#   norms    float32 (n,), original centroid norms
+#   labels   fixed-width utf-8 bytes (n,)
+#   counts   uint32 (n,), samples per centroid (version 2+)
+# centroid = matrix * norm and sum = centroid * count, so per-voter updates
+# are exact without revisiting anyone else's samples.
+GALLERY_MAGIC = b"VCGALLRY"
+GALLERY_VERSION = 2
+_HEADER = struct.Struct("<8sIQII")
+_ALIGN = 64
+
+Match = namedtuple("Match", ["label", "score", "margin"])
+
+def l2_normalize(x, axis=-1):
+    x = np.asarray(x, dtype=np.float32)
+    norm = np.linalg.norm(x, axis=axis, keepdims=True)
+    return x / np.maximum(norm, 1e-12)
+
+def _encode_labels(labels):
+    """Sorted utf-8 bytes array, the dtype labels are stored with."""
+    return np.char.encode(np.asarray(sorted(labels), dtype=str), 'utf-8')
+
+def _aligned(offset):
+    return -(-offset // _ALIGN) * _ALIGN
+
+def _layout(n, dim, label_width):
+    matrix_off = _aligned(_HEADER.size)
+    norms_off = _aligned(matrix_off + 4 * n * dim)
+    labels_off = _aligned(norms_off + 4 * n)
+    counts_off = _aligned(labels_off + n * label_width)
+    return matrix_off, norms_off, labels_off, counts_off, counts_off + 4 * n
+
+def _install(tmp, path):
+    """os.replace(tmp, path), retried while `path` is in use; then <path>.new."""
+    pending = path + PENDING_SUFFIX
+    for _ in range(SAVE_RETRIES):
+        try:
+            os.replace(tmp, path)
+        except PermissionError:
+            time.sleep(SAVE_RETRY_DELAY)
+            continue
+        if os.path.exists(pending):
+            try:
+                os.remove(pending)
+            except OSError:
+                pass    # older than `path` now, so open() ignores it
+        return path
+    try:
+        os.replace(tmp, pending)
+    except PermissionError:
+        os.remove(tmp)
+        raise PermissionError(f"{path} and {pending} are both in use by running booths; "
+                              f"restart them and save again") from None
+    print(f"[WARN] {path} is in use by a running booth; gallery saved as {pending}. "
+          f"Booths switch to it on reload or restart.")
+    return pending
+
+# ------------ GALLERY ------------
+class Gallery:
+    """Enrolled centroids as one contiguous, L2-normalized float32 matrix.
+
+    Row i of `matrix` is the unit-length centroid for `labels[i]`, so the
+    cosine similarity against every identity is a single mat-vec product.
+    With an `index` attached only its candidate rows are scored. Labels are
+    kept as utf-8 bytes so a memory-mapped label table is used as-is.
+    """
+
+    def __init__(self, labels, matrix, norms=None, counts=None, index=None, reranker=None):
+        labels = np.asarray(labels)
+        if labels.dtype.kind == 'U':
+            labels = np.char.encode(labels, 'utf-8')
+        self.labels = labels
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.norms = (np.ones(len(labels), dtype=np.float32) if norms is None
+                      else np.asarray(norms, dtype=np.float32))
+        self.counts = (np.ones(len(labels), dtype=np.uint32) if counts is None
+                       else np.asarray(counts, dtype=np.uint32))
+        self.index = index
+        self.reranker = reranker
+
+    @classmethod
+    def from_centroids(cls, centroids):
+        labels = sorted(centroids)
+        if not labels:
+            return cls(np.array([], dtype='S1'), np.zeros((0, 512), dtype=np.float32))
+        raw = np.stack([np.asarray(centroids[lbl], dtype=np.float32) for lbl in labels])
+        return cls(labels, l2_normalize(raw), np.linalg.norm(raw, axis=1))
+
+    @classmethod
+    def from_sums(cls, labels, sums, counts):
+        counts = np.asarray(counts, dtype=np.uint32)
+        raw = np.asarray(sums, dtype=np.float32) / np.maximum(counts, 1)[:, None]
+        return cls(labels, l2_normalize(raw), np.linalg.norm(raw, axis=1), counts)
+
+    @classmethod
+    def from_pickle(cls, path=MODEL_PATH):
+        raw = joblib.load(path)
+        centroids = raw.get('centroids', {}) if isinstance(raw, dict) else {}
+        return cls.from_centroids(centroids)
+
+    @classmethod
+    def open(cls, path=GALLERY_PATH):
+        """Memory-map a gallery file read-only; pages are shared between processes.
+
+        A newer <path>.new left by save() is moved into place first, or
+        read directly while `path` is still mapped elsewhere.
+        """
+        pending = path + PENDING_SUFFIX
+        if os.path.exists(pending) and (not os.path.exists(path) or
+                                        os.path.getmtime(pending) >= os.path.getmtime(path)):
+            try:
+                os.replace(pending, path)
+            except PermissionError:
+                path = pending
+        with open(path, "rb") as f:
+            magic, version, n, dim, label_width = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != GALLERY_MAGIC:
+            raise ValueError(f"{path} is not a gallery file")
+        if not 1 <= version <= GALLERY_VERSION:
+            raise ValueError(f"{path}: unsupported gallery version {version}")
+        if n == 0:
+            return cls(np.array([], dtype='S1'), np.zeros((0, dim), dtype=np.float32))
+        matrix_off, norms_off, labels_off, counts_off, _ = _layout(n, dim, label_width)
+        matrix = np.memmap(path, np.float32, "r", matrix_off, (n, dim))
+        norms = np.memmap(path, np.float32, "r", norms_off, (n,))
+        labels = np.memmap(path, f"S{label_width}", "r", labels_off, (n,))
+        # Version 1 files carry no counts; each centroid then counts once.
+        counts = np.memmap(path, np.uint32, "r", counts_off, (n,)) if version >= 2 else None
+        return cls(labels, matrix, norms, counts)
+
+    @classmethod
+    def load(cls, path=GALLERY_PATH, index_path=INDEX_PATH, model_path=MODEL_PATH,
+             reranker_path=RERANKER_PATH):
+        if os.path.exists(path):
+            gallery = cls.open(path)
+        else:
+            print(f"[WARN] {path} not found; reading legacy {model_path} "
+                  f"(run 'python gallery.py' to convert it)")
+            gallery = cls.from_pickle(model_path)
+        if index_path and os.path.exists(index_path):
+            gallery.attach_index(IVFIndex.load(index_path))
+        # train_faces writes the re-ranker only in 'classifier' mode, so a
+        # centroid booth never unpickles the training state.
+        if reranker_path and os.path.exists(reranker_path):
+            gallery.reranker = ClassifierReranker.load(reranker_path)
+        return gallery
+
+    def save(self, path=GALLERY_PATH):
+        """Write the gallery atomically: readers see either the old or the new file.
+
+        Returns the path written: `path`, or <path>.new when `path` stays
+        memory-mapped by a running booth (Windows cannot replace it).
+        """
+        n, dim = self.matrix.shape
+        label_width = max(1, self.labels.dtype.itemsize)
+        matrix_off, norms_off, labels_off, counts_off, size = _layout(n, dim, label_width)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(GALLERY_MAGIC, GALLERY_VERSION, n, dim, label_width))
+            for off, arr in ((matrix_off, self.matrix),
+                             (norms_off, self.norms),
+                             (labels_off, self.labels.astype(f"S{label_width}")),
+                             (counts_off, self.counts)):
+                f.seek(off)
+                f.write(np.ascontiguousarray(arr).tobytes())
+            f.truncate(size)
+            f.flush()
+            os.fsync(f.fileno())
+        return _install(tmp, path)
+
+    def centroids(self):
+        """Un-normalized centroids as a {label: vector} dict, for training."""
+        return {self.label(i): self.matrix[i] * self.norms[i] for i in range(len(self))}
+
+    def updated(self, sums=None, remove=()):
+        """New in-memory gallery with some identities replaced or dropped.
+
+        `sums` maps label -> (sum of embeddings, sample count); existing
+        rows for those labels are overwritten in place and unknown labels
+        are appended. `remove` lists labels to drop. Untouched rows are
+        copied as-is, so the cost is one array copy plus the changed rows.
+        """
+        sums = sums or {}
+        keep = ~np.isin(self.labels, _encode_labels(remove)) if remove else np.ones(len(self), bool)
+        labels = self.labels[keep]
+        matrix = np.array(self.matrix[keep])
+        norms = np.array(self.norms[keep])
+        counts = np.array(self.counts[keep])
+        if not sums:
+            return Gallery(labels, matrix, norms, counts)
+
+        changed = _encode_labels(sums)
+        width = max(labels.dtype.itemsize, changed.dtype.itemsize)
+        labels = labels.astype(f"S{width}")
+        changed = changed.astype(f"S{width}")
+        new = Gallery.from_sums(changed,
+                                [sums[l.decode('utf-8')][0] for l in changed],
+                                [sums[l.decode('utf-8')][1] for l in changed])
+        # `changed` is sorted, so each replaced row finds its source by bisection.
+        hit = np.flatnonzero(np.isin(labels, changed))
+        src = np.searchsorted(changed, labels[hit])
+        matrix[hit], norms[hit], counts[hit] = new.matrix[src], new.norms[src], new.counts[src]
+        add = ~np.isin(changed, labels[hit])
+        return Gallery(np.concatenate([labels, changed[add]]),
+                       np.concatenate([matrix, new.matrix[add]]),
+                       np.concatenate([norms, new.norms[add]]),
+                       np.concatenate([counts, new.counts[add]]))
+
+    def attach_index(self, index):
+        if not index.matches(self.labels):
+            print("[WARN] ANN index is stale for this gallery; using exact search")
+            return False
+        self.index = index
+        return True
+
+    def label(self, i):
+        return self.labels[i].decode('utf-8')
+
+    def __len__(self):
+        return len(self.labels)
+
+    def top_k(self, emb, k=TOP_K, nprobe=ANN_NPROBE):
+        """Return (row indices, scores) of the k best rows, best first.
+
+        Scores are always exact cosines; the index (if any) only narrows
+        which rows get scored.
+        """
+        q = l2_normalize(emb)
+        rows = None
+        if self.index is not None and nprobe:
+            rows = self.index.candidates(q, nprobe)
+        if rows is not None and len(rows):
+            scores = self.matrix[rows] @ q
+        else:
+            rows = None
+            scores = self.matrix @ q
+        k = min(k, len(scores))
+        if k < len(scores):
+            idx = np.argpartition(-scores, k - 1)[:k]
+        else:
+            idx = np.arange(len(scores))
+        idx = idx[np.argsort(-scores[idx])]
+        return (idx if rows is None else rows[idx]), scores[idx]
+
+    def search(self, emb, k=TOP_K):
+        """Best match with its cosine score and margin over the runner-up.
+
+        Returns None for an empty gallery; margin is None when only one
+        identity is enrolled.
+        """
+        return self.search_batch([emb], k)[0]
+
+    def search_batch(self, embs, k=TOP_K):
+        """search() for several embeddings, re-ranking them in one batch.
+
+        With a classifier attached the label is the classifier's pick among
+        the RERANK_K best cosine candidates; score and margin stay cosine
+        values so SIM_THRESHOLD keeps its meaning.
+        """
+        if not len(self):
+            return [None] * len(embs)
+        k = RERANK_K if self.reranker is not None else max(k, 2)
+        cands = [self.top_k(emb, k) for emb in embs]
+        if self.reranker is None:
+            return [self._match(idx, scores, 0) for idx, scores in cands]
+
+        # Equal-width candidate sets so the classifier scores them in one go.
+        width = min(len(idx) for idx, _ in cands)
+        idx = np.stack([c[0][:width] for c in cands])
+        cos = np.stack([c[1][:width] for c in cands])
+        clf_scores = self.reranker.scores(self.labels[idx], np.asarray(embs, dtype=np.float32))
+        best = np.argmax(clf_scores, axis=1)
+        return [self._match(idx[b], cos[b], best[b]) for b in range(len(embs))]
+
+    def _match(self, idx, scores, pick):
+        others = np.delete(scores, pick)
+        margin = float(scores[pick] - others.max()) if len(others) else None
+        return Match(self.label(idx[pick]), float(scores[pick]), margin)
+
+# ------------ CLASSIFIER RE-RANKER ------------
+class ClassifierReranker:
+    """Scores gallery candidates with the linear classifier from training.
+
+    Only the candidates' coefficient rows are used, so the cost per query
+    is k dot products rather than one per enrolled voter. Saved as plain
+    arrays in RERANKER_PATH, so booths load it without joblib or sklearn.
+    """
+
+    def __init__(self, coef, intercept, classes):
+        self.coef = np.ascontiguousarray(coef, dtype=np.float32)
+        self.intercept = np.asarray(intercept, dtype=np.float32)
+        self.classes = np.asarray(classes, dtype=str)
+        self.row_of = {c: i for i, c in enumerate(np.char.encode(self.classes, 'utf-8'))}
+
+    @classmethod
+    def from_classifier(cls, clf):
+        coef = np.asarray(clf.coef_, dtype=np.float32)
+        intercept = np.asarray(clf.intercept_, dtype=np.float32)
+        if len(clf.classes_) == 2 and len(coef) == 1:
+            # Binary SGD keeps a single hyperplane for classes_[1].
+            coef = np.vstack([-coef, coef])
+            intercept = np.concatenate([-intercept, intercept])
+        return cls(coef, intercept, clf.classes_)
+
+    @classmethod
+    def load(cls, path=RERANKER_PATH):
+        with np.load(path) as raw:
+            return cls(raw['coef'], raw['intercept'], raw['classes'])
+
+    def save(self, path=RERANKER_PATH):
+        """Write the weights atomically; load() reads them fully, so nothing stays open."""
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, coef=self.coef, intercept=self.intercept, classes=self.classes)
+        os.replace(tmp, path)
+
+    def scores(self, labels, embs):
+        """(B, k) decision values for candidate `labels` (B, k) and embeddings (B, d)."""
+        rows = np.array([[self.row_of.get(l, -1) for l in row] for row in labels])
+        out = np.einsum('bkd,bd->bk', self.coef[rows], embs) + self.intercept[rows]
+        out[rows < 0] = -np.inf
+        return out
+
+# ------------ CONVERTER ------------
+def convert_pickle(src=MODEL_PATH, dst=GALLERY_PATH):
+    """One-time conversion of a legacy face_encodings.pkl to the gallery format."""
+    gallery = Gallery.from_pickle(src)
+    gallery.save(dst)
+    print(f"[INFO] Converted {len(gallery)} identities: {src} -> {dst}")
+    return gallery
+
+if __name__ == "__main__":
+    if len(sys.argv) > 3:
+        print("Usage: python gallery.py [face_encodings.pkl] [face_gallery.bin]")
+        sys.exit(1)
+    convert_pickle(*sys.argv[1:])
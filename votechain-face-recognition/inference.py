@@ -0,0 +1,225 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from face_models import align_kps
+from metrics import metrics
+
+# ------------ CONFIG ------------
+INFER_MAX_PENDING = 64      # queued requests before submitters block (backpressure)
+INFER_MAX_BATCH = 16        # aligned crops per recognition-model call
+INFER_MAX_WAIT = 0.003      # seconds the first crop waits for others to batch with
+
+class InferenceQueue:
+    """One thread owns the FaceAnalysis model; any number of booths share it.
+
+    Callers submit "get" (face_model.get), "detect" (det_model.detect) and
+    "embed" (recognition get_feat on aligned crops) requests and wait on a
+    Future. proxy() returns a stand-in for FaceAnalysis, so FaceTracker,
+    PresenceDetector and PipelinedSession run unchanged on top of it.
+
+    Recognition is micro-batched: once a request with crops arrives, the
+    worker keeps collecting for up to `max_wait` seconds or `max_batch`
+    crops, then embeds all of them with one get_feat call per
+    `max_batch`. "get" is split into detection plus alignment so its
+    crops join the same batch; with ALLOWED_MODULES (detection and
+    recognition only) that is exactly what FaceAnalysis.get does. With
+    a single client (one proxy) nobody can join, so the worker never
+    waits. Detection stays one frame per call: the SCRFD graph has a
+    fixed batch of 1.
+    """
+
+    def __init__(self, face_model, max_pending=INFER_MAX_PENDING, max_batch=INFER_MAX_BATCH,
+                 max_wait=INFER_MAX_WAIT):
+        self.face_model = face_model
+        self.jobs = queue.Queue(maxsize=max_pending)
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.clients = 0
+        self.thread = None
+        self.requests = 0
+        self.embed_calls = 0
+        self.embed_crops = 0
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="inference", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        if self.thread is not None:
+            # Never block behind a full queue: fail the oldest jobs to make
+            # room for the sentinel.
+            while True:
+                try:
+                    self.jobs.put_nowait(None)
+                    break
+                except queue.Full:
+                    self._drain(1)
+            self.thread.join(timeout=5.0)
+            self.thread = None
+        self._drain()
+
+    def _drain(self, limit=None):
+        """Fail up to `limit` queued jobs (all of them by default)."""
+        while limit is None or limit > 0:
+            try:
+                job = self.jobs.get_nowait()
+            except queue.Empty:
+                return
+            if job is not None:
+                job[3].set_exception(RuntimeError("inference queue stopped"))
+            if limit is not None:
+                limit -= 1
+
+    def submit(self, kind, *args, **kwargs):
+        if self.thread is None:
+            raise RuntimeError("inference queue is not running")
+        future = Future()
+        self.jobs.put((kind, args, kwargs, future, time.perf_counter()))
+        return future
+
+    def call(self, kind, *args, **kwargs):
+        return self.submit(kind, *args, **kwargs).result()
+
+    def proxy(self):
+        self.clients += 1
+        return SharedFaceModel(self)
+
+    # ------------ WORKER ------------
+    def _take(self):
+        """Block for one job, then gather the batch: everything already
+        queued, plus whatever arrives within max_wait while crops are
+        waiting to be embedded."""
+        jobs = [self.jobs.get()]
+        crops = _crop_count(jobs[0])
+        deadline = time.perf_counter() + self.max_wait
+        while jobs[-1] is not None and crops < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            try:
+                if crops and self.clients > 1 and timeout > 0:
+                    job = self.jobs.get(timeout=timeout)
+                else:
+                    job = self.jobs.get_nowait()
+            except queue.Empty:
+                break
+            jobs.append(job)
+            crops += _crop_count(job)
+        return jobs
+
+    def _run(self):
+        while True:
+            jobs = self._take()
+            stop = jobs[-1] is None
+            jobs = [j for j in jobs if j is not None]
+            now = time.perf_counter()
+            for job in jobs:
+                metrics.observe("infer_wait", now - job[4])
+            self.requests += len(jobs)
+
+            # Detection first (it also yields the crops of "get"), then
+            # one embedding pass over every crop in the batch.
+            pending = []        # (future, crops, finish)
+            for kind, args, kwargs, future, _ in jobs:
+                try:
+                    if kind == "embed":
+                        pending.append((future, list(args[0]), None))
+                    elif kind == "get":
+                        faces, crops = self._detect_align(*args, **kwargs)
+                        pending.append((future, crops, faces))
+                    elif kind == "detect":
+                        with metrics.stage("detect"):
+                            future.set_result(self.face_model.det_model.detect(*args, **kwargs))
+                    else:
+                        raise ValueError(f"unknown inference request {kind!r}")
+                except Exception as e:
+                    future.set_exception(e)
+            self._embed(pending)
+            if stop:
+                return
+
+    def _detect_align(self, img, max_num=0):
+        """The detection half of FaceAnalysis.get: faces plus their ArcFace crops."""
+        from insightface.app.common import Face
+
+        with metrics.stage("detect"):
+            bboxes, kpss = self.face_model.det_model.detect(img, max_num=max_num,
+                                                            metric='default')
+        faces, crops = [], []
+        with metrics.stage("align"):
+            for bbox, kps in zip(bboxes, kpss):
+                faces.append(Face(bbox=bbox[:4], kps=kps, det_score=bbox[4]))
+                crops.append(align_kps(img, kps))
+        return faces, crops
+
+    def _embed(self, pending):
+        crops = [crop for _, c, _ in pending for crop in c]
+        feats = np.zeros((0, 512), dtype=np.float32)
+        try:
+            if crops:
+                parts = []
+                for i in range(0, len(crops), self.max_batch):
+                    chunk = crops[i:i + self.max_batch]
+                    with metrics.stage("embed"):
+                        parts.append(np.asarray(
+                            self.face_model.models['recognition'].get_feat(chunk),
+                            dtype=np.float32))
+                    self.embed_calls += 1
+                    self.embed_crops += len(chunk)
+                feats = np.concatenate(parts)
+        except Exception as e:
+            for future, _, _ in pending:
+                future.set_exception(e)
+            return
+        start = 0
+        for future, c, faces in pending:
+            rows = feats[start:start + len(c)]
+            start += len(c)
+            if faces is None:
+                future.set_result(rows)
+            else:
+                for face, emb in zip(faces, rows):
+                    face.embedding = emb
+                future.set_result(faces)
+
+def _crop_count(job):
+    """Crops a queued job will add to the recognition batch (get: at least one)."""
+    if job is None:
+        return 0
+    kind, args = job[0], job[1]
+    if kind == "embed":
+        return len(args[0])
+    return 1 if kind == "get" else 0
+
+class _SharedDetector:
+    def __init__(self, inference):
+        self.inference = inference
+
+    def detect(self, img, **kwargs):
+        return self.inference.call("detect", img, **kwargs)
+
+class _SharedRecognizer:
+    def __init__(self, inference):
+        self.inference = inference
+
+    def get_feat(self, crops):
+        return self.inference.call("embed", list(crops))
+
+class SharedFaceModel:
+    """FaceAnalysis look-alike whose calls run on an InferenceQueue.
+
+    Covers what the booth code uses: get(), det_model.detect() and
+    models['recognition'].get_feat() (through embed_aligned).
+    """
+
+    def __init__(self, inference):
+        self.inference = inference
+        self.det_model = _SharedDetector(inference)
+        self.models = {'recognition': _SharedRecognizer(inference)}
+
+    def get(self, img, **kwargs):
+        return self.inference.call("get", img, **kwargs)
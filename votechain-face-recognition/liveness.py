@@ -0,0 +1,271 @@
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from metrics import metrics
+
+# ------------ CONFIG ------------
+BLINK_CLOSED_THRESH = 0.22
+BLINK_OPEN_THRESH = 0.28
+BLINK_CLOSED_FRAMES = 4
+BLINK_OPEN_FRAMES = 4
+REQUIRED_BLINKS = 3
+MIN_BLINK_DURATION = 0.1
+MAX_BLINK_DURATION = 0.8
+YAW_THRESH = 15.0
+YAW_METHOD = 'pnp'          # or 'geometry': closed form from the landmarks, no solvePnP
+
+LEFT_EYE = [33, 160, 158, 133, 153, 144]
+RIGHT_EYE = [362, 385, 387, 263, 373, 380]
+MODEL_POINTS = np.array([
+    (0.0, 0.0, 0.0),
+    (0.0, -63.6, -12.5),
+    (-43.3, 32.7, -26.0),
+    (43.3, 32.7, -26.0),
+    (-28.9, -28.9, -24.1),
+    (28.9, -28.9, -24.1)
+], dtype=np.float64)
+IDX = [1, 199, 33, 263, 61, 291]
+EYE_HALF_WIDTH = 43.3       # MODEL_POINTS outer eye corners: x = +-43.3,
+EYE_DEPTH = 26.0            # 26 behind the nose tip
+FACE_BOX_IDX = [10, 152, 234, 454]  # forehead, chin, left and right face edge
+
+# Region of interest: the mesh runs on a crop around the previous face box.
+ROI_TRACKING = True
+ROI_PAD = 0.35              # padding on each side, as a fraction of the box size
+ROI_MIN_SIZE = 64           # smaller crops fall back to the full frame
+
+# Only these mesh points are read; rows into the per-frame array.
+USED_IDX = sorted(set(LEFT_EYE + RIGHT_EYE + IDX + FACE_BOX_IDX))
+_EYE_ROWS = np.searchsorted(USED_IDX, LEFT_EYE + RIGHT_EYE)
+_POSE_ROWS = np.searchsorted(USED_IDX, IDX)
+_BOX_ROWS = np.searchsorted(USED_IDX, FACE_BOX_IDX)
+_EAR_PAIRS = np.array([[1, 2, 0, 7, 8, 6], [5, 4, 3, 11, 10, 9]])
+
+Landmarks = namedtuple("Landmarks", ["ear", "image_points", "eye_points", "box"])
+
+# ------------ LANDMARK UTILS ------------
+def create_face_mesh():
+    import mediapipe as mp
+
+    return mp.solutions.face_mesh.FaceMesh(
+        static_image_mode=False,
+        max_num_faces=1,
+        refine_landmarks=True,
+        min_detection_confidence=0.5
+    )
+
+def landmark_array(lm, idxs=USED_IDX):
+    """(len(idxs), 3) float64 array of normalized x, y, z for a MediaPipe landmark list."""
+    pts = [lm[i] for i in idxs]
+    return np.array([[p.x for p in pts], [p.y for p in pts], [p.z for p in pts]]).T
+
+def analyze_landmarks(lm, shape, offset=(0, 0)):
+    """Everything liveness needs from one frame's mesh, from a single array.
+
+    `shape` is the image the mesh ran on and `offset` its top-left corner
+    in the full frame; all pixel coordinates are full-frame.
+
+    ear          mean eye aspect ratio of both eyes
+    image_points (6, 2) float64 pixel coordinates for solvePnP (IDX order)
+    eye_points   (12, 2) int32 pixel coordinates of LEFT_EYE + RIGHT_EYE
+    box          (x1, y1, x2, y2) face extent from FACE_BOX_IDX
+    """
+    h, w = shape[:2]
+    xy = landmark_array(lm)[:, :2] * (w, h) + offset
+    eyes = xy[_EYE_ROWS].astype(np.int32)
+    # Vertical pairs (1,5), (2,4) and horizontal (0,3) of both eyes at once.
+    d = np.diff(eyes[_EAR_PAIRS], axis=0)[0].astype(np.float64)
+    a1, b1, c1, a2, b2, c2 = np.hypot(d[:, 0], d[:, 1]).tolist()
+    ear = ((a1 + b1) / c1 + (a2 + b2) / c2) / 4.0
+    box = xy[_BOX_ROWS]
+    return Landmarks(ear, xy[_POSE_ROWS], eyes, (*box.min(axis=0), *box.max(axis=0)))
+
+def _process(face_mesh, image, offset=(0, 0)):
+    with metrics.stage("convert"):
+        rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    with metrics.stage("mesh"):
+        res = face_mesh.process(rgb)
+    if not res.multi_face_landmarks:
+        return None
+    return analyze_landmarks(res.multi_face_landmarks[0].landmark, image.shape, offset)
+
+def get_landmarks(face_mesh, frame):
+    """Landmarks for the first face in the full `frame`, or None."""
+    return _process(face_mesh, frame)
+
+class LandmarkTracker:
+    """Runs the face mesh on a padded crop around the last known face.
+
+    The crop follows the face box of the previous frame's landmarks (or a
+    detector bbox passed to seed()), so colour conversion and mesh input
+    cover the face instead of the whole frame. When the mesh finds nothing
+    in the crop the same frame is retried full-frame.
+    """
+
+    def __init__(self, face_mesh, pad=ROI_PAD, enabled=ROI_TRACKING):
+        self.face_mesh = face_mesh
+        self.pad = pad
+        self.enabled = enabled
+        self.box = None
+        self.fallbacks = 0
+
+    def seed(self, bbox):
+        """Start from a detector box (x1, y1, x2, y2), e.g. InsightFace's bbox."""
+        self.box = None if bbox is None else tuple(float(v) for v in bbox[:4])
+
+    def reset(self):
+        self.box = None
+
+    def crop(self, shape):
+        """Padded, clipped integer crop (x1, y1, x2, y2) around self.box, or None."""
+        h, w = shape[:2]
+        x1, y1, x2, y2 = self.box
+        px, py = (x2 - x1) * self.pad, (y2 - y1) * self.pad
+        x1, y1 = max(0, int(x1 - px)), max(0, int(y1 - py))
+        x2, y2 = min(w, int(x2 + px)), min(h, int(y2 + py))
+        if x2 - x1 < ROI_MIN_SIZE or y2 - y1 < ROI_MIN_SIZE:
+            return None
+        return x1, y1, x2, y2
+
+    def process(self, frame):
+        """Landmarks (full-frame coordinates) for `frame`, or None."""
+        lm = None
+        roi = self.crop(frame.shape) if self.enabled and self.box is not None else None
+        if roi is not None:
+            x1, y1, x2, y2 = roi
+            lm = _process(self.face_mesh, frame[y1:y2, x1:x2], (x1, y1))
+            if lm is None:
+                self.fallbacks += 1
+        if lm is None:
+            lm = _process(self.face_mesh, frame)
+        self.box = lm.box if lm is not None else None
+        return lm
+
+def draw_eyes(frame, lm, color):
+    for x, y in lm.eye_points.tolist():
+        cv2.circle(frame, (x, y), 2, color, -1)
+
+# ------------ STATE MACHINES ------------
+class BlinkCounter:
+    """Per-frame blink state machine, fed with EAR and capture timestamp."""
+
+    def __init__(self, required=REQUIRED_BLINKS):
+        self.required = required
+        self.count = 0
+        self.state = 'open'
+        self.closed_frames = self.open_frames = 0
+        self.blink_start = None
+
+    @property
+    def done(self):
+        return self.count >= self.required
+
+    def update(self, ear, ts):
+        """Feed one frame (ear=None when no face); returns the blink count."""
+        if ear is None:
+            self.closed_frames = self.open_frames = 0
+        elif self.state == 'open':
+            if ear < BLINK_CLOSED_THRESH:
+                self.closed_frames += 1
+                if self.closed_frames >= BLINK_CLOSED_FRAMES:
+                    self.state = 'closed'
+                    self.blink_start = ts
+                    self.closed_frames = 0
+            else:
+                self.closed_frames = 0
+        else:
+            if ear > BLINK_OPEN_THRESH:
+                self.open_frames += 1
+                if self.open_frames >= BLINK_OPEN_FRAMES:
+                    duration = ts - self.blink_start
+                    if MIN_BLINK_DURATION < duration < MAX_BLINK_DURATION:
+                        self.count += 1
+                    self.state = 'open'
+                    self.open_frames = 0
+            else:
+                self.open_frames = 0
+        return self.count
+
+def camera_intrinsics(shape):
+    """Pinhole camera matrix (focal = frame width) and zero distortion."""
+    f = shape[1]
+    c = (f / 2, shape[0] / 2)
+    cam_mat = np.array([[f,0,c[0]],[0,f,c[1]],[0,0,1]], dtype="double")
+    return cam_mat, np.zeros((4,1))
+
+def geometric_yaw(image_points):
+    """Signed yaw in degrees (same sign as pnp_yaw) from the nose tip and
+    outer eye corners, no PnP.
+
+    With MODEL_POINTS rotated about the vertical axis, the nose tip moves
+    off the eye-corner midpoint by EYE_DEPTH*sin(yaw) while the half
+    distance between the corners shrinks to EYE_HALF_WIDTH*cos(yaw)
+    (orthographic approximation, so it reads a few degrees high).
+    """
+    nose, left, right = image_points[0], image_points[2], image_points[3]
+    axis = right - left
+    half = np.hypot(axis[0], axis[1]) / 2.0
+    if half == 0:
+        return None
+    offset = np.dot(nose - (left + right) / 2.0, axis) / (2.0 * half)
+    return float(np.degrees(np.arctan(-offset / half * EYE_HALF_WIDTH / EYE_DEPTH)))
+
+class HeadTurnDetector:
+    """Yaw from six mesh landmarks; `turned` once past YAW_THRESH.
+
+    method='pnp' solves the head pose with iterative solvePnP, seeded with
+    the previous frame's pose; method='geometry' reads yaw straight from
+    the landmark layout (geometric_yaw).
+    """
+
+    def __init__(self, thresh=YAW_THRESH, method=YAW_METHOD):
+        self.thresh = thresh
+        self.method = method
+        self.turned = False
+        self.yaw = None
+        self.shape = None
+        self.intrinsics = None
+        self.rvec = self.tvec = None
+
+    def reset(self):
+        """Drop the pose guess, e.g. after the face was lost."""
+        self.rvec = self.tvec = None
+
+    def pnp_yaw(self, image_points, shape):
+        """Signed yaw in degrees from solvePnP, or None if it failed."""
+        if shape[:2] != self.shape:
+            self.shape = shape[:2]
+            self.intrinsics = camera_intrinsics(shape)
+            self.reset()
+        cam_mat, dist = self.intrinsics
+        if self.rvec is not None:
+            ok, rvec, tvec = cv2.solvePnP(MODEL_POINTS, image_points, cam_mat, dist,
+                                          self.rvec, self.tvec, useExtrinsicGuess=True,
+                                          flags=cv2.SOLVEPNP_ITERATIVE)
+            # A seed from a stale pose can converge behind the camera.
+            if not ok or tvec[2, 0] <= 0:
+                self.reset()
+        if self.rvec is None:
+            ok, rvec, tvec = cv2.solvePnP(MODEL_POINTS, image_points, cam_mat, dist)
+            if not ok:
+                return None
+        self.rvec, self.tvec = rvec, tvec
+        rot, _ = cv2.Rodrigues(rvec)
+        # Rotation about the camera's vertical axis (MODEL_POINTS are y-up,
+        # so the pose includes a flip about x that leaves column 0 alone).
+        return float(np.degrees(np.arcsin(np.clip(-rot[2,0], -1.0, 1.0))))
+
+    def update(self, lm, shape):
+        """Feed one frame's Landmarks; returns the absolute yaw in degrees or None."""
+        if self.method == 'geometry':
+            yaw = geometric_yaw(lm.image_points)
+        else:
+            yaw = self.pnp_yaw(lm.image_points, shape)
+        if yaw is None:
+            return None
+        self.yaw = abs(yaw)
+        if self.yaw > self.thresh:
+            self.turned = True
+        return self.yaw
@@ -0,0 +1,148 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+
+# ------------ CONFIG ------------
+METRICS_ENABLED = False     # off: stage() hands out one shared no-op context
+METRICS_PROM_PATH = None    # Prometheus text file rewritten after every session
+# Histogram bucket upper bounds in seconds (Prometheus "le" labels).
+BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0)
+
+_NOOP = nullcontext()
+
+class Histogram:
+    """Fixed-bucket latency histogram; quantiles are interpolated within a bucket."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        target, seen, lower = q * self.count, 0, 0.0
+        for bound, n in zip(BUCKETS, self.counts):
+            if n and seen + n >= target:
+                # Linear within the bucket, as Prometheus' histogram_quantile does.
+                return min(lower + (bound - lower) * (target - seen) / n, self.max)
+            seen += n
+            lower = bound
+        return self.max
+
+    def to_dict(self):
+        ms = lambda s: round(s * 1000.0, 3)
+        return {"count": self.count, "mean_ms": ms(self.sum / self.count),
+                "p50_ms": ms(self.quantile(0.5)), "p95_ms": ms(self.quantile(0.95)),
+                "max_ms": ms(self.max), "total_ms": ms(self.sum)}
+
+class _Timer:
+    __slots__ = ("metrics", "name", "t0")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.t0)
+
+class Metrics:
+    """Per-stage latency histograms for the booth pipeline.
+
+    Code under test wraps a stage in `with metrics.stage("mesh"):` or
+    reports a measured duration with metrics.observe(). Stages:
+
+      capture            cap.read() in the FrameGrabber thread (camera I/O)
+      frame_age          capture timestamp -> liveness picks the frame up
+      convert            colour conversion (BGR->RGB for the mesh, ->gray for flow)
+      motion             idle-loop motion check (resize, gray, blur, diff)
+      mesh               MediaPipe face mesh
+      detect             face detector alone
+      track              optical-flow step of FaceTracker
+      align / embed      ArcFace crop and recognition model
+      detect_embed       face_model.get (detection + embedding in one call)
+      match              gallery search / embedding aggregation
+      draw               overlays + imshow on the display thread
+      liveness_frame     one liveness iteration, end to end
+      recognition_frame  one recognition iteration, end to end
+
+    Every observation goes into a per-session and a cumulative histogram.
+    session_report() returns the session's histograms as a dict, starts a
+    new session and rewrites the Prometheus file when one is configured.
+    When disabled, stage() returns a shared no-op context and observe()
+    returns at once, so the instrumentation costs one attribute check.
+    """
+
+    def __init__(self, enabled=METRICS_ENABLED, prom_path=METRICS_PROM_PATH):
+        self.enabled = enabled
+        self.prom_path = prom_path
+        self.lock = threading.Lock()
+        self.session = {}
+        self.total = {}
+
+    def configure(self, enabled=None, prom_path=None):
+        if prom_path is not None:
+            self.prom_path = prom_path
+            enabled = True if enabled is None else enabled
+        if enabled is not None:
+            self.enabled = enabled
+        return self
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NOOP
+        return _Timer(self, name)
+
+    def observe(self, name, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            for hists in (self.session, self.total):
+                hist = hists.get(name)
+                if hist is None:
+                    hist = hists[name] = Histogram()
+                hist.observe(seconds)
+
+    def session_report(self):
+        """{stage: {count, mean_ms, p50_ms, p95_ms, max_ms, total_ms}} since the last report."""
+        with self.lock:
+            session, self.session = self.session, {}
+        if self.prom_path:
+            self.write_prometheus(self.prom_path)
+        return {name: hist.to_dict() for name, hist in sorted(session.items())}
+
+    def prometheus(self):
+        """Cumulative histograms in the Prometheus text exposition format."""
+        lines = ["# HELP votechain_stage_seconds Booth pipeline stage latency.",
+                 "# TYPE votechain_stage_seconds histogram"]
+        with self.lock:
+            for name, hist in sorted(self.total.items()):
+                seen = 0
+                for bound, n in zip(BUCKETS, hist.counts):
+                    seen += n
+                    lines.append(f'votechain_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {seen}')
+                lines.append(f'votechain_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {hist.count}')
+                lines.append(f'votechain_stage_seconds_sum{{stage="{name}"}} {hist.sum:.6f}')
+                lines.append(f'votechain_stage_seconds_count{{stage="{name}"}} {hist.count}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Atomically replace `path`, e.g. for node_exporter's textfile collector."""
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(self.prometheus())
+        os.replace(tmp, path)
+
+metrics = Metrics()
@@ -0,0 +1,199 @@
+"""Serve several booths (camera + serial channel each) from one process.
+
+    python multi_booth.py --booth 0,COM4 --booth 1,COM5
+    python multi_booth.py --booth 0,/dev/ttyUSB0 --booth 1,/dev/ttyUSB1 --headless
+
+buffalo_l and the gallery are loaded once and shared through an
+InferenceQueue; every booth has its own FrameGrabber, face mesh,
+presence detector, session state machine and serial channel.
+"""
+import argparse
+import statistics
+import threading
+import time
+
+from camera import FrameGrabber
+from display import Control, Display, text
+from face_models import create_face_model
+from gallery import Gallery
+from inference import InferenceQueue, INFER_MAX_BATCH, INFER_MAX_WAIT
+from presence import PresenceDetector
+from serial_manager import SerialManager
+from session import PipelinedSession
+import liveness
+
+# ------------ CONFIG ------------
+GALLERY_PATH = "face_gallery.bin"
+RECOGNITION_DURATION = 50.0
+SIM_THRESHOLD = 0.5
+CYCLE_COOLDOWN = 1.5
+
+class Booth:
+    """The faceDetect.py continuous loop for one camera, as a thread.
+
+    Idle presence check -> PipelinedSession -> serial result -> cooldown,
+    until the stream ends or control.quit is set. `face_model` is
+    normally InferenceQueue.proxy(); the face mesh is per booth because
+    MediaPipe graphs must not be shared across threads. 'q' aborts the
+    voters of every booth (best effort), Esc / SIGINT stops all of them.
+    """
+
+    def __init__(self, name, source, face_model, gallery, control, display=None,
+                 serial_port=None, realtime=None, threshold=SIM_THRESHOLD,
+                 timeout=RECOGNITION_DURATION, cooldown=CYCLE_COOLDOWN):
+        self.name = name
+        self.source = source
+        self.face_model = face_model
+        self.gallery = gallery
+        self.control = control
+        self.display = display
+        self.serial = SerialManager(serial_port) if serial_port else None
+        self.realtime = realtime
+        self.threshold = threshold
+        self.timeout = timeout
+        self.cooldown = cooldown
+        self.face_mesh = liveness.create_face_mesh()
+        self.presence = PresenceDetector(face_model)
+        self.thread = None
+
+        self.started = None
+        self.stopped = None
+        self.idle_frames = 0
+        self.idle_time = 0.0
+        self.session_time = 0.0
+        self.session_frames = {"liveness": 0, "recognition": 0}
+        self.outcomes = []
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name=f"booth-{self.name}", daemon=True)
+        self.thread.start()
+        return self
+
+    def join(self, timeout=None):
+        self.thread.join(timeout)
+        return not self.thread.is_alive()
+
+    def _show(self, frame, *overlays):
+        if self.display is not None:
+            self.display.show(self.name, frame, *overlays)
+
+    def run(self):
+        cam = FrameGrabber(self.source, realtime=self.realtime).start()
+        if self.serial:
+            self.serial.open()
+        self.started = time.time()
+        try:
+            if not cam.isOpened():
+                print(f"[ERROR] {self.name}: cannot open {self.source}")
+                return
+            while not self.control.quit.is_set():
+                t0 = time.time()
+                found = False
+                while not self.control.quit.is_set():
+                    ret, frame = cam.read()
+                    if not ret:
+                        if not cam.isOpened():
+                            break
+                        continue
+                    self.idle_frames += 1
+                    self._show(frame, text("Waiting for face...", (10,30), (255,255,255)))
+                    if self.presence.check(frame):
+                        found = True
+                        break
+                self.idle_time += time.time() - t0
+                if not found:
+                    return
+
+                face_box = self.presence.bbox
+                self.presence.reset()
+                t1 = time.time()
+                outcome = PipelinedSession(cam, self.face_model, self.face_mesh, self.gallery,
+                                           threshold=self.threshold, timeout=self.timeout,
+                                           display=self.display, face_box=face_box,
+                                           window=self.name).run()
+                self.session_time += time.time() - t1
+                for k, n in outcome["frames"].items():
+                    self.session_frames[k] += n
+                self.outcomes.append(outcome)
+                ok = outcome["result"] == "success"
+                if ok:
+                    print(f"[AUTH] {self.name} SUCCESS:", outcome["label"],
+                          f"sim={outcome['score']:.2f}")
+                else:
+                    reason = outcome.get("error", "timeout or not recognized")
+                    print(f"[AUTH] {self.name} FAILED ({reason})")
+                if self.serial:
+                    self.serial.send_auth_result(ok)
+                if self.control.abort.is_set():
+                    self.control.reset_abort()
+                self.control.quit.wait(self.cooldown)
+        finally:
+            self.stopped = time.time()
+            cam.release()
+            if self.serial:
+                self.serial.close()
+
+    def stats(self):
+        """Per-stream throughput and decision latency so far."""
+        decisions = [o["timings"]["time_to_decision"] for o in self.outcomes]
+        rate = lambda n, t: n / t if t > 0 else 0.0
+        return {
+            "booth": self.name,
+            "idle_fps": rate(self.idle_frames, self.idle_time),
+            "liveness_fps": rate(self.session_frames["liveness"], self.session_time),
+            "recognition_fps": rate(self.session_frames["recognition"], self.session_time),
+            "sessions": len(self.outcomes),
+            "success": sum(o["result"] == "success" for o in self.outcomes),
+            "decision_median": statistics.median(decisions) if decisions else None,
+            "decision_max": max(decisions) if decisions else None,
+        }
+
+def parse_booth(spec):
+    """"SOURCE[,SERIAL_PORT]"; a numeric source is a camera index."""
+    source, _, port = spec.partition(",")
+    return (int(source) if source.isdigit() else source), (port or None)
+
+# ------------ MAIN ------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--booth", action="append", required=True, metavar="SOURCE[,PORT]",
+                        help="camera index or video, and optionally its serial port")
+    parser.add_argument("--gallery", default=GALLERY_PATH)
+    parser.add_argument("--ctx", type=int, default=0)
+    parser.add_argument("--headless", action="store_true", help="never open windows")
+    parser.add_argument("--max-batch", type=int, default=INFER_MAX_BATCH,
+                        help="aligned crops per recognition call")
+    parser.add_argument("--max-wait", type=float, default=INFER_MAX_WAIT,
+                        help="seconds a crop waits for others to batch with")
+    args = parser.parse_args(argv)
+
+    control = Control()
+    control.install_signal_handlers()
+    display = Display(control, mode='headless' if args.headless else 'window').start()
+
+    t0 = time.time()
+    inference = InferenceQueue(create_face_model(ctx_id=args.ctx), max_batch=args.max_batch,
+                               max_wait=args.max_wait).start()
+    gallery = Gallery.load(args.gallery)
+    print(f"[INFO] Models ready in {time.time() - t0:.2f}s, {len(gallery)} identities")
+
+    booths = []
+    for i, spec in enumerate(args.booth):
+        source, port = parse_booth(spec)
+        booths.append(Booth(f"Booth {i + 1}", source, inference.proxy(), gallery, control,
+                            display=display, serial_port=port).start())
+    print(f"[INFO] Serving {len(booths)} booths: press Esc or Ctrl+C to quit.")
+    try:
+        while not all(b.join(0.5) for b in booths):
+            pass
+    finally:
+        control.request("quit")
+        for b in booths:
+            b.join(2.0)
+        inference.stop()
+        display.close()
+        display.stop()
+        print("[INFO] Stopped.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import time
+
+import cv2
+import numpy as np
+
+from metrics import metrics
+
+# ------------ CONFIG ------------
+MOTION_WIDTH = 160          # frames are diffed at this width, in grayscale
+MOTION_PIXEL_DELTA = 25     # per-pixel change that counts as motion
+MOTION_FRACTION = 0.01      # share of changed pixels that wakes the detector
+PRESENCE_DET_SIZE = (320, 320)
+PRESENCE_INTERVAL = 0.2     # at most one detector pass per interval
+PRESENCE_RECHECK = 2.0      # detector pass even without motion (voter standing still)
+
+class PresenceDetector:
+    """Cheap "is somebody at the booth" check for the idle loop.
+
+    Every frame is reduced to a small blurred grayscale image and diffed
+    against the previous one. Only when enough pixels changed (or every
+    PRESENCE_RECHECK seconds) does it run the face detector alone, at
+    PRESENCE_DET_SIZE and at most once per PRESENCE_INTERVAL. Recognition
+    is never run here; the full pipeline starts once check() returns True.
+    """
+
+    def __init__(self, face_model, det_size=PRESENCE_DET_SIZE, interval=PRESENCE_INTERVAL,
+                 recheck=PRESENCE_RECHECK, motion_fraction=MOTION_FRACTION):
+        self.det_model = face_model.det_model
+        self.det_size = det_size
+        self.interval = interval
+        self.recheck = recheck
+        self.motion_fraction = motion_fraction
+        self.prev = None
+        self.moved = False          # motion seen since the last detector pass
+        self.last_detect = 0.0
+        self.detections = 0
+        self.bbox = None            # last detected face, for seeding the mesh ROI
+
+    def motion(self, frame):
+        """Fraction of pixels that changed since the previous frame."""
+        with metrics.stage("motion"):
+            return self._motion(frame)
+
+    def _motion(self, frame):
+        h, w = frame.shape[:2]
+        small = cv2.resize(frame, (MOTION_WIDTH, max(1, h * MOTION_WIDTH // w)),
+                           interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        prev, self.prev = self.prev, gray
+        if prev is None:
+            return 1.0
+        return np.count_nonzero(cv2.absdiff(gray, prev) > MOTION_PIXEL_DELTA) / gray.size
+
+    def detect(self, frame):
+        with metrics.stage("detect"):
+            bboxes, _ = self.det_model.detect(frame, input_size=self.det_size, max_num=1)
+        self.detections += 1
+        self.bbox = bboxes[0, :4] if len(bboxes) else None
+        return self.bbox is not None
+
+    def check(self, frame, now=None):
+        """True when a face is likely present in `frame`."""
+        now = time.time() if now is None else now
+        self.moved |= self.motion(frame) >= self.motion_fraction
+        since = now - self.last_detect
+        if since < self.interval or (not self.moved and since < self.recheck):
+            return False
+        self.last_detect = now
+        self.moved = False
+        return self.detect(frame)
+
+    def reset(self):
+        """Forget the reference frame, e.g. after a session left the idle loop."""
+        self.prev = None
+        self.moved = False
+        self.last_detect = 0.0
@@ -0,0 +1,203 @@
+import queue
+import threading
+import time
+
+import serial
+
+# ------------ CONFIG ------------
+SERIAL_BAUD = 115200
+SERIAL_TIMEOUT = 0.5
+SERIAL_QUEUE_SIZE = 32      # outbound lines kept while the port is down
+SERIAL_POLL = 0.1           # read timeout of the writer loop (s)
+SERIAL_BACKOFF = (0.5, 10.0)    # reconnect delay: first, max (doubles per failure)
+# The controller may confirm each line with a line starting with SERIAL_ACK.
+# Only with require_ack are unconfirmed lines re-sent: firmware that never
+# acks would otherwise get every result several times.
+SERIAL_ACK = "ACK"
+SERIAL_REQUIRE_ACK = False
+SERIAL_ACK_TIMEOUT = 1.0
+SERIAL_RETRIES = 3
+SERIAL_DRAIN_TIMEOUT = 2.0  # close() waits this long for queued lines
+
+class SerialManager:
+    """Booth controller link: one "87,1" / "87,0" line per auth result.
+
+    send_auth_result() only queues the line; a writer thread owns the
+    port, so a missing or stalled controller never blocks frame
+    processing. The thread (re)opens the port with exponential backoff
+    and keeps queued lines until they are written, so results survive
+    unplugging the cable. Without require_ack a line is never sent twice:
+    it counts as delivered once write() took all of it. With require_ack
+    it is re-sent until the controller answers SERIAL_ACK, up to
+    `retries` times. A full queue drops its oldest line, loudly.
+
+    `port` is anything serial.serial_for_url() takes: "COM4",
+    "/dev/ttyUSB0", a pty from serial_sim.py, or "loop://" for a
+    loopback without hardware.
+    """
+
+    def __init__(self, port, baud=SERIAL_BAUD, timeout=SERIAL_TIMEOUT,
+                 require_ack=SERIAL_REQUIRE_ACK, ack_timeout=SERIAL_ACK_TIMEOUT,
+                 retries=SERIAL_RETRIES, queue_size=SERIAL_QUEUE_SIZE):
+        self.port = port
+        self.baud = baud
+        self.timeout = timeout
+        self.require_ack = require_ack
+        self.ack_timeout = ack_timeout
+        self.retries = retries
+        self.outbox = queue.Queue(maxsize=queue_size)
+        self.ser = None
+        self.failures = 0
+        self.running = False
+        self.thread = None
+        self.pending = 0        # queued or being written; guarded by self.done
+        self.done = threading.Condition()
+        self.stats = {"sent": 0, "acked": 0, "unacked": 0, "retries": 0,
+                      "dropped": 0, "reconnects": 0}
+
+    def open(self):
+        """Start the writer thread; the port is opened (and re-opened) there."""
+        if self.thread is None:
+            self.running = True
+            self.thread = threading.Thread(target=self._run, name=f"serial-{self.port}",
+                                           daemon=True)
+            self.thread.start()
+
+    def close(self, drain_timeout=SERIAL_DRAIN_TIMEOUT):
+        """Give queued lines `drain_timeout` seconds to go out, then stop."""
+        if self.thread is not None:
+            with self.done:
+                self.done.wait_for(lambda: self.pending == 0, drain_timeout)
+            self.running = False
+            self.thread.join(timeout=drain_timeout + 1.0)
+            self.thread = None
+        with self.done:
+            left = self.pending
+        if left:
+            print(f"[SERIAL] Closing with {left} result(s) not sent")
+        self._disconnect()
+
+    def send_auth_result(self, ok: bool):
+        if ok:
+            self._enqueue("87,1")   # success
+        else:
+            self._enqueue("87,0")   # failure
+
+    def _enqueue(self, line):
+        if not line.endswith("\n"):
+            line += "\n"
+        with self.done:
+            self.pending += 1
+        while True:
+            try:
+                self.outbox.put_nowait(line)
+                return
+            except queue.Full:
+                try:
+                    lost = self.outbox.get_nowait()
+                except queue.Empty:
+                    continue
+                self._finish()
+                self.stats["dropped"] += 1
+                print(f"[SERIAL] Queue full, dropped {lost.strip()!r}")
+
+    def _finish(self):
+        with self.done:
+            self.pending -= 1
+            self.done.notify_all()
+
+    # ------------ WRITER THREAD ------------
+    def _connect(self):
+        try:
+            self.ser = serial.serial_for_url(self.port, self.baud, timeout=SERIAL_POLL,
+                                             write_timeout=self.timeout)
+            retried = f" after {self.failures} retries" if self.failures else ""
+            print(f"[SERIAL] Opened {self.port} @ {self.baud}{retried}")
+            self.failures = 0
+            return True
+        except (serial.SerialException, OSError, ValueError) as e:
+            self.ser = None
+            if not self.failures:
+                print(f"[SERIAL] Could not open {self.port}: {e} (retrying)")
+            self.failures += 1
+            return False
+
+    def _disconnect(self):
+        try:
+            if self.ser and self.ser.is_open:
+                self.ser.close()
+                print("[SERIAL] Closed")
+        except Exception:
+            pass
+        self.ser = None
+
+    def _wait_ack(self):
+        deadline = time.time() + self.ack_timeout
+        while time.time() < deadline:
+            reply = self.ser.readline().decode("utf-8", "replace").strip()
+            if reply.startswith(SERIAL_ACK):
+                return True
+        return False
+
+    def _write(self, line):
+        data = line.encode("utf-8")
+        n = self.ser.write(data)
+        if n is not None and n < len(data):
+            raise serial.SerialException(f"short write ({n}/{len(data)} bytes)")
+        self.stats["sent"] += 1
+
+    def _deliver(self, line):
+        """Write one line (re-sending until acked when required).
+
+        Raises while the line has not gone out, so the caller reconnects
+        and retries it. Without require_ack, an error after write() took
+        the whole line is returned instead: the port is reopened but the
+        line is not sent again.
+        """
+        if not self.require_ack:
+            self._write(line)
+            try:
+                self.ser.flush()
+            except Exception as e:
+                return e
+            return None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.stats["retries"] += 1
+            self._write(line)
+            self.ser.flush()
+            if self._wait_ack():
+                self.stats["acked"] += 1
+                return None
+        self.stats["unacked"] += 1
+        print(f"[SERIAL] No ack for {line.strip()!r} after {self.retries + 1} attempts")
+        return None
+
+    def _run(self):
+        delay = SERIAL_BACKOFF[0]
+        line = None
+        while self.running:
+            if self.ser is None:
+                if not self._connect():
+                    time.sleep(delay)
+                    delay = min(delay * 2, SERIAL_BACKOFF[1])
+                    continue
+                delay = SERIAL_BACKOFF[0]
+            if line is None:
+                try:
+                    line = self.outbox.get(timeout=SERIAL_POLL)
+                except queue.Empty:
+                    continue
+            try:
+                error = self._deliver(line)
+                line = None
+                self._finish()
+            except Exception as e:
+                # serial, OS or termios errors alike: keep `line`, it goes
+                # out again once the port is back.
+                error = e
+            if error is not None:
+                print(f"[SERIAL] write error: {error}")
+                self.stats["reconnects"] += 1
+                self._disconnect()
+        self._disconnect()
@@ -0,0 +1,126 @@
+"""Booth controller stand-in on a pseudo-terminal (POSIX), for testing without hardware.
+
+    python serial_sim.py --link /tmp/booth0
+    python serial_sim.py --link /tmp/booth0 --drop-every 3 --hangup-after 5
+
+Prints every line it receives and answers "ACK,<line>". Point
+SerialManager (SERIAL_PORT in faceDetect.py, --booth 0,/tmp/booth0 in
+multi_booth.py) at the --link path: a hangup closes the pty and opens a
+new one behind the same link, like a cable being re-plugged. On
+Windows use a com0com pair or SerialManager("loop://") instead.
+"""
+import argparse
+import os
+import pty
+import select
+import threading
+import time
+import tty
+
+class ControllerSim:
+    def __init__(self, link=None, ack=True, drop_every=0, hangup_after=0, hangup_for=1.0):
+        self.link = link
+        self.ack = ack
+        self.drop_every = drop_every
+        self.hangup_after = hangup_after
+        self.hangup_for = hangup_for
+        self.master = None
+        self.slave = None
+        self.path = None
+        self.received = []
+        self.running = False
+        self.thread = None
+
+    def _open(self):
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+        self.path = os.ttyname(self.slave)
+        if self.link:
+            tmp = self.link + ".tmp"
+            if os.path.lexists(tmp):
+                os.remove(tmp)
+            os.symlink(self.path, tmp)
+            os.replace(tmp, self.link)
+
+    def _close(self):
+        for fd in (self.master, self.slave):
+            if fd is not None:
+                os.close(fd)
+        self.master = self.slave = None
+
+    def start(self):
+        self._open()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="serial-sim", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+            self.thread = None
+        self._close()
+        if self.link and os.path.islink(self.link):
+            os.remove(self.link)
+
+    def hangup(self):
+        """Drop the line for hangup_for seconds, then come back on a new pty."""
+        print(f"[SIM] Hangup ({self.hangup_for:.1f}s)")
+        self._close()
+        if self.link and os.path.islink(self.link):
+            os.remove(self.link)
+        time.sleep(self.hangup_for)
+        self._open()
+        print(f"[SIM] Back on {self.path}")
+
+    def _run(self):
+        buf = b""
+        while self.running:
+            ready, _, _ = select.select([self.master], [], [], 0.1)
+            if not ready:
+                continue
+            try:
+                data = os.read(self.master, 1024)
+            except OSError:
+                data = b""
+            if not data:
+                continue
+            buf += data
+            while b"\n" in buf:
+                raw, buf = buf.split(b"\n", 1)
+                line = raw.decode("utf-8", "replace").strip()
+                self.received.append(line)
+                n = len(self.received)
+                dropped = self.drop_every and n % self.drop_every == 0
+                print(f"[SIM] <- {line}" + ("  (no ack)" if dropped else ""))
+                if self.ack and not dropped:
+                    os.write(self.master, f"ACK,{line}\n".encode("utf-8"))
+                if self.hangup_after and n % self.hangup_after == 0:
+                    buf = b""
+                    self.hangup()
+                    break
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--link", help="stable symlink to the current pty")
+    parser.add_argument("--no-ack", action="store_true", help="never answer (plain firmware)")
+    parser.add_argument("--drop-every", type=int, default=0, help="skip every Nth ack")
+    parser.add_argument("--hangup-after", type=int, default=0,
+                        help="re-plug the line after every N lines")
+    parser.add_argument("--hangup-for", type=float, default=1.0)
+    args = parser.parse_args()
+
+    sim = ControllerSim(args.link, ack=not args.no_ack, drop_every=args.drop_every,
+                        hangup_after=args.hangup_after, hangup_for=args.hangup_for).start()
+    print(f"[SIM] Listening on {args.link or sim.path}: Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+import threading
+import time
+
+import cv2
+
+import liveness
+from liveness import BlinkCounter, HeadTurnDetector, REQUIRED_BLINKS
+from tracking import FaceTracker
+from aggregation import EmbeddingAggregator
+from metrics import metrics
+from events import EventStream
+
+# ------------ CONFIG ------------
+SIM_THRESHOLD = 0.5
+SESSION_TIMEOUT = 50.0      # seconds from session start to a FAILED decision
+STABLE_FRAMES = 3           # consecutive recognized frames with the same label
+RECOGNITION_TRACKING = True  # optical-flow face tracking between detections
+RECOGNITION_AGGREGATE = True  # sequential decision on the aggregated embeddings
+
+class PipelinedSession:
+    """Liveness and recognition over the same camera stream, in parallel.
+
+    The liveness worker walks every frame (cam.reader) through the blink and
+    head-turn state machines; the recognition worker embeds the newest
+    frame (cam.latest) and feeds an EmbeddingAggregator until it accepts
+    or rejects the tracked face (with aggregate=False: until the same
+    voter matched `stable_frames` frames in a row). The decision fires as
+    soon as liveness has passed and the identity is accepted, or as soon
+    as the identity is rejected, instead of starting recognition after
+    liveness. Blinks and head turns score low, so a reject is final only
+    once liveness has passed; before that it just restarts the aggregate.
+
+    Each worker owns its model (face_mesh / face_model), so neither is
+    shared across threads. The mesh runs on a crop around the face,
+    starting from `face_box` when the idle loop already found one.
+    The calling thread only waits for the decision, queues the newest
+    frame with its overlays on `display` (None: headless) and honours
+    `display.control` aborts. Workers report liveness_passed and match
+    on `events` as they happen.
+    """
+
+    def __init__(self, cam, face_model, face_mesh, gallery, threshold=SIM_THRESHOLD,
+                 timeout=SESSION_TIMEOUT, stable_frames=STABLE_FRAMES, display=None,
+                 face_box=None, tracking=RECOGNITION_TRACKING,
+                 aggregate=RECOGNITION_AGGREGATE, events=None, window="Session"):
+        self.cam = cam
+        self.face_model = face_model
+        self.face_tracker = FaceTracker(face_model) if tracking else None
+        self.tracker = liveness.LandmarkTracker(face_mesh)
+        self.tracker.seed(face_box)
+        self.gallery = gallery
+        self.aggregator = EmbeddingAggregator(gallery, threshold) if aggregate else None
+        self.threshold = threshold
+        self.timeout = timeout
+        self.stable_frames = stable_frames
+        self.display = display
+        self.control = display.control if display is not None else None
+        self.events = events or EventStream()
+        self.window = window
+
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.stop = False
+        self.blinks = BlinkCounter()
+        self.head = HeadTurnDetector()
+        self.live = False
+        self.best = None        # Match of the current streak / aggregate
+        self.streak = 0
+        self.identity = "pending"   # "accept" / "reject" once decided
+        self.bbox = None
+        self.t0 = None
+        self.timings = {}
+        self.frames = {"liveness": 0, "recognition": 0}
+        self.error = None       # first exception raised by a worker
+
+    # ------------ WORKERS ------------
+    def _mark(self, name):
+        self.timings.setdefault(name, time.time() - self.t0)
+
+    def _guard(self, work):
+        """Run a worker; if it crashes, stop the session and keep the error for run()."""
+        try:
+            work()
+        except Exception as e:
+            print(f"[ERROR] {threading.current_thread().name} worker failed:", repr(e))
+            with self.lock:
+                if self.error is None:
+                    self.error = e
+                self.stop = True
+                self.changed.notify_all()
+
+    def _liveness(self):
+        with self.cam.reader() as frames:
+            while not self.stop:
+                fr = frames.next()
+                if fr is None:
+                    if not self.cam.isOpened():
+                        break
+                    continue
+                _, ts, frame = fr
+                self.frames["liveness"] += 1
+                t = time.perf_counter()
+                metrics.observe("frame_age", time.time() - ts)
+                lm = self.tracker.process(frame)
+                with self.lock:
+                    if not self.blinks.done:
+                        self.blinks.update(None if lm is None else lm.ear, ts)
+                        if self.blinks.done:
+                            self._mark("time_to_blinks")
+                    elif lm is not None:
+                        try:
+                            self.head.update(lm, frame.shape)
+                        except Exception as e:
+                            print("[ERROR] Head turn detection failed:", str(e))
+                    else:
+                        self.head.reset()
+                    if self.blinks.done and self.head.turned:
+                        self.live = True
+                        self._mark("time_to_liveness")
+                        self.changed.notify_all()
+                if self.live:
+                    self.events.emit("liveness_passed", elapsed=self.timings["time_to_liveness"])
+                    return
+                metrics.observe("liveness_frame", time.perf_counter() - t)
+        with self.lock:
+            self.changed.notify_all()
+
+    def _recognition(self):
+        seq = -1
+        while not self.stop:
+            fr = self.cam.latest(seq)
+            if fr is None:
+                if not self.cam.isOpened():
+                    break
+                continue
+            seq, _, frame = fr
+            self.frames["recognition"] += 1
+            t = time.perf_counter()
+            if self.face_tracker:
+                faces = self.face_tracker.get(frame)
+            else:
+                with metrics.stage("detect_embed"):
+                    faces = self.face_model.get(frame)
+            if self.aggregator is not None:
+                with metrics.stage("match"):
+                    decision = self.aggregator.add(faces[0]) if faces else None
+                metrics.observe("recognition_frame", time.perf_counter() - t)
+                with self.lock:
+                    self.bbox = faces[0].bbox.astype(int) if faces else None
+                    if decision is not None and decision.state == "reject" and not self.live:
+                        # Frames from blinking / turning the head score low;
+                        # only a reject on frames after liveness is final.
+                        self.aggregator.reset()
+                        decision = decision._replace(state="pending")
+                    if decision is not None:
+                        self.best, self.identity = decision.match, decision.state
+                    if self.identity != "pending":
+                        self._mark("time_to_identity")
+                        self.changed.notify_all()
+                if self.identity != "pending":
+                    if self.identity == "accept":
+                        self._emit_match()
+                    return
+                continue
+
+            with metrics.stage("match"):
+                best = self.gallery.search(faces[0].embedding) if faces else None
+            metrics.observe("recognition_frame", time.perf_counter() - t)
+            first = False
+            with self.lock:
+                self.bbox = faces[0].bbox.astype(int) if faces else None
+                if best is None or best.score < self.threshold:
+                    self.streak = 0
+                    self.best = best
+                elif self.best is not None and self.streak and best.label == self.best.label:
+                    self.streak += 1
+                    # Keep the strongest frame of the streak for the report.
+                    if best.score > self.best.score:
+                        self.best = best
+                else:
+                    self.streak = 1
+                    self.best = best
+                self.identity = "accept" if self.streak >= self.stable_frames else "pending"
+                if self.identity == "accept":
+                    first = "time_to_identity" not in self.timings
+                    self._mark("time_to_identity")
+                self.changed.notify_all()
+            if first:
+                self._emit_match()
+        with self.lock:
+            self.changed.notify_all()
+
+    def _emit_match(self):
+        # Only the recognition worker writes best/timings["time_to_identity"].
+        best = self.best
+        self.events.emit("match", label=best.label, score=best.score, margin=best.margin,
+                         elapsed=self.timings["time_to_identity"])
+
+    # ------------ DECISION ------------
+    def _decided(self):
+        return self.live and self.identity == "accept"
+
+    def _overlay(self):
+        with self.lock:
+            bbox, best = self.bbox, self.best
+            recognized = self.identity == "accept" or (self.aggregator is None and self.streak > 0)
+            status = ("Liveness OK" if self.live else
+                      f"Blink {self.blinks.count}/{REQUIRED_BLINKS}" if not self.blinks.done
+                      else "Turn head left/right")
+
+        def draw(frame):
+            color = (0,255,0) if recognized else (0,0,255)
+            if bbox is not None:
+                x1,y1,x2,y2 = bbox
+                cv2.rectangle(frame, (x1,y1), (x2,y2), color, 2)
+                text = f"Voter: {best.label}" if recognized else "Not recognized"
+                cv2.putText(frame, text, (x1, max(30,y1-10)),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
+            cv2.putText(frame, status, (10,30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0,255,255), 2)
+        return draw
+
+    def run(self):
+        """Run until decision, timeout, end of stream or abort; return a result dict
+        ("error" with the message if a worker crashed)."""
+        self.t0 = time.time()
+        workers = [threading.Thread(target=self._guard, args=(work,), name=name, daemon=True)
+                   for work, name in ((self._liveness, "liveness"),
+                                      (self._recognition, "recognition"))]
+        for w in workers:
+            w.start()
+
+        deadline = self.t0 + self.timeout
+        seq = -1
+        try:
+            while time.time() < deadline:
+                if self.control is not None and self.control.aborted():
+                    break
+                with self.lock:
+                    if self._decided() or self.identity == "reject" or self.error:
+                        break
+                    if not any(w.is_alive() for w in workers):
+                        break
+                    self.changed.wait(min(0.1, max(0.0, deadline - time.time())))
+                if self.display is not None:
+                    fr = self.cam.latest(seq, timeout=0)
+                    if fr is not None:
+                        seq = fr.seq
+                        self.display.show(self.window, fr.image, self._overlay())
+        finally:
+            self.stop = True
+            for w in workers:
+                w.join(timeout=2.0)
+            if self.display is not None:
+                self.display.close(self.window)
+
+        with self.lock:
+            ok = self._decided() and self.error is None
+            best, error = self.best, self.error
+        self.timings["time_to_decision"] = time.time() - self.t0
+        result = {"result": "success" if ok else "failed", "timings": dict(self.timings),
+                  "frames": dict(self.frames)}
+        if error is not None:
+            result.update(result="error", error=f"{type(error).__name__}: {error}")
+        elif ok:
+            result.update(label=best.label, score=best.score, margin=best.margin)
+        return result
@@ -0,0 +1,94 @@
+"""FrameGrabber lossless playback with mixed consumers.
+
+    python -m unittest discover -s tests
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from camera import FrameGrabber
+
+FRAMES = 100
+
+def write_video(path, frames=FRAMES):
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30, (64, 48))
+    for i in range(frames):
+        out.write(np.full((48, 64, 3), i % 256, np.uint8))
+    out.release()
+
+class LosslessTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.video = os.path.join(cls.tmp.name, "session.avi")
+        write_video(cls.video)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def read_to_eof(self, cam, limit=10.0):
+        """read() until the stream ends; fails instead of hanging."""
+        n, deadline = 0, time.time() + limit
+        while cam.isOpened():
+            self.assertLess(time.time(), deadline, f"stalled after {n} frames at seq {cam.seq}")
+            ret, _ = cam.read()
+            n += ret
+        return n
+
+    def test_reader_then_read_on_one_thread(self):
+        # Sequential session: blinks walk every frame, then head turn and
+        # recognition read() on the same thread.
+        cam = FrameGrabber(self.video).start()
+        try:
+            with cam.reader() as frames:
+                seqs = [frames.next().seq for _ in range(5)]
+            self.assertEqual(seqs, list(range(5)))
+            self.read_to_eof(cam)
+            self.assertEqual(cam.seq, FRAMES - 1)
+        finally:
+            cam.release()
+
+    def test_reader_sees_every_frame_next_to_latest(self):
+        # Pipelined session: liveness walks every frame while recognition
+        # takes the newest one.
+        cam = FrameGrabber(self.video).start()
+        seen = []
+
+        def liveness():
+            with cam.reader() as frames:
+                while True:
+                    fr = frames.next()
+                    if fr is None:
+                        return
+                    seen.append(fr.seq)
+                    time.sleep(0.002)
+
+        def recognition():
+            seq = -1
+            while True:
+                fr = cam.latest(seq)
+                if fr is None:
+                    return
+                seq = fr.seq
+
+        workers = [threading.Thread(target=liveness), threading.Thread(target=recognition)]
+        try:
+            for w in workers:
+                w.start()
+            for w in workers:
+                w.join(timeout=20.0)
+            self.assertEqual(seen, list(range(FRAMES)))
+        finally:
+            cam.release()
+
+if __name__ == "__main__":
+    unittest.main()
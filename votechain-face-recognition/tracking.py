@@ -0,0 +1,116 @@
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from face_models import align_kps, embed_aligned
+from metrics import metrics
+
+# ------------ CONFIG ------------
+TRACK_REDETECT_EVERY = 10   # frames tracked by optical flow between detector passes
+TRACK_MAX_FB_ERROR = 2.0    # forward-backward flow error (px) that counts as lost
+TRACK_MIN_IOU = 0.3         # a re-detection overlapping this much keeps the track id
+LK_PARAMS = dict(winSize=(21, 21), maxLevel=3,
+                 criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03))
+
+TrackedFace = namedtuple("TrackedFace",
+                         ["bbox", "kps", "embedding", "det_score", "track_id", "detected"])
+
+def iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+class FaceTracker:
+    """Drop-in for face_model.get() on a video stream with one voter.
+
+    The detector runs on the first frame, every TRACK_REDETECT_EVERY
+    frames and whenever tracking fails; in between, the five detector
+    keypoints are followed with pyramidal Lucas-Kanade flow (checked
+    forward-backward) and the face box moves and scales with them. Every
+    frame is still aligned from the keypoints and embedded by the
+    recognition model alone, so embeddings match face_model.get().
+
+    Faces carry a `track_id` that survives re-detections of the same
+    face, so callers can accumulate embeddings per track.
+    """
+
+    def __init__(self, face_model, redetect=TRACK_REDETECT_EVERY,
+                 max_fb_error=TRACK_MAX_FB_ERROR):
+        self.face_model = face_model
+        self.det_model = face_model.det_model
+        self.redetect = redetect
+        self.max_fb_error = max_fb_error
+        self.track_id = 0
+        self.detections = 0
+        self.frames = 0
+        self.reset()
+
+    def reset(self):
+        """Forget the current face; the next frame is detected."""
+        self.prev_gray = None
+        self.kps = None
+        self.bbox = None
+        self.det_score = None
+        self.since_detect = 0
+
+    def _detect(self, frame):
+        with metrics.stage("detect"):
+            bboxes, kpss = self.det_model.detect(frame, max_num=1)
+        self.detections += 1
+        if not len(bboxes):
+            return None, None
+        return bboxes[0], kpss[0]
+
+    def _flow(self, gray):
+        p0 = self.kps.astype(np.float32).reshape(-1, 1, 2)
+        p1, st, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, p0, None, **LK_PARAMS)
+        if p1 is None or not st.all():
+            return None
+        back, st, _ = cv2.calcOpticalFlowPyrLK(gray, self.prev_gray, p1, None, **LK_PARAMS)
+        if back is None or not st.all():
+            return None
+        if np.linalg.norm((back - p0).reshape(-1, 2), axis=1).max() > self.max_fb_error:
+            return None
+        kps = p1.reshape(-1, 2)
+        # Move and scale the box with the keypoints.
+        c0, c1 = self.kps.mean(axis=0), kps.mean(axis=0)
+        s0 = np.linalg.norm(self.kps - c0, axis=1).mean()
+        scale = np.linalg.norm(kps - c1, axis=1).mean() / s0 if s0 > 0 else 1.0
+        x1, y1, x2, y2 = self.bbox[:4]
+        bbox = np.array([c1[0] + (x1 - c0[0]) * scale, c1[1] + (y1 - c0[1]) * scale,
+                         c1[0] + (x2 - c0[0]) * scale, c1[1] + (y2 - c0[1]) * scale])
+        return kps, bbox
+
+    def get(self, frame):
+        """[TrackedFace] for the voter in `frame`, or [] when no face is found."""
+        self.frames += 1
+        with metrics.stage("convert"):
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        tracked = None
+        if self.kps is not None and self.since_detect < self.redetect:
+            with metrics.stage("track"):
+                tracked = self._flow(gray)
+        if tracked is not None:
+            kps, bbox = tracked
+            self.since_detect += 1
+            detected = False
+        else:
+            det, kps = self._detect(frame)
+            if det is None:
+                self.reset()
+                return []
+            bbox = det[:4]
+            if self.bbox is None or iou(bbox, self.bbox) < TRACK_MIN_IOU:
+                self.track_id += 1
+            self.det_score = float(det[4])
+            self.since_detect = 0
+            detected = True
+        self.prev_gray, self.kps, self.bbox = gray, kps, bbox
+        with metrics.stage("align"):
+            crop = align_kps(frame, kps)
+        with metrics.stage("embed"):
+            emb = embed_aligned(self.face_model, [crop])[0]
+        return [TrackedFace(bbox, kps, emb, self.det_score, self.track_id, detected)]
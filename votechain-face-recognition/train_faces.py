@@ -1,64 +1,184 @@
 import os
+import argparse
+import hashlib
+import time
+import multiprocessing
 import cv2
 import numpy as np
 import joblib
 from sklearn.linear_model import SGDClassifier
-from collections import defaultdict
-from insightface.app import FaceAnalysis
+from face_models import create_face_model, embed_aligned, MODEL_NAME
+from dataset import aligned_path, load_embeddings
+from gallery import Gallery, ClassifierReranker, GALLERY_PATH, RERANKER_PATH
+from ann_index import IVFIndex, INDEX_PATH, ANN_MIN_SIZE
+from embedding_cache import EmbeddingCache
 
 # CONFIGURATION
 DATA_DIR = "dataset"
-MODEL_PATH = "face_encodings.pkl"
+EXTRACT_WORKERS = 1       # processes for embedding extraction (1 = in-process)
+EXTRACT_CHUNKSIZE = 8
+MODEL_PATH = "face_encodings.pkl"   # training state; centroids live in GALLERY_PATH
+BUILD_ANN_INDEX = True   # build face_index.npz once the gallery is large enough
+# 'centroid': gallery only, no classifier fit (recognize() only needs centroids).
+# 'classifier': also fit an SGDClassifier that recognize() uses to re-rank
+# the best cosine candidates.
+GALLERY_MODE = 'centroid'
+CLF_MAX_ITER = 1000
 
-# Initialize InsightFace
-model = FaceAnalysis(name='buffalo_l')
-model.prepare(ctx_id=-1)
+# InsightFace is initialized on first use so a fully cached retrain never
+# loads it.
+model = None
 
-def get_embeddings_for_ids(voter_ids, data_dir=DATA_DIR):
-    X, y = [], []
+def get_model(threads=None):
+    global model
+    if model is None:
+        model = create_face_model(ctx_id=-1, threads=threads)
+    return model
+
+def init_worker(threads):
+    # Every pool process has its own ONNX Runtime sessions; left at one
+    # thread per core each, N workers oversubscribe the CPU N times.
+    cv2.setNumThreads(1)
+    get_model(threads)
+
+def embed_image(path):
+    # Aligned crop stored at capture time: recognition model only.
+    crop = cv2.imread(aligned_path(path))
+    if crop is not None:
+        return embed_aligned(get_model(), [crop])[0]
+    img = cv2.imread(path)
+    if img is None:
+        return None
+    faces = get_model().get(img)
+    return faces[0].embedding if faces else None
+
+def list_images(voter_ids, data_dir=DATA_DIR):
+    items = []
     for vid in voter_ids:
         folder = os.path.join(data_dir, vid)
         if not os.path.isdir(folder):
             continue
-        for fname in os.listdir(folder):
-            if not fname.lower().endswith(('.jpg', '.jpeg', '.png')):
-                continue
-            path = os.path.join(folder, fname)
-            img = cv2.imread(path)
-            if img is None:
-                continue
-            faces = model.get(img)
-            if not faces:
-                continue
-            X.append(faces[0].embedding)
-            y.append(vid)
+        for fname in sorted(os.listdir(folder)):
+            if fname.lower().endswith(('.jpg', '.jpeg', '.png')):
+                items.append((vid, os.path.join(folder, fname)))
+    return items
+
+def extract_embeddings(paths, workers=EXTRACT_WORKERS):
+    """Yield one embedding (or None) per path, in the order given.
+
+    With workers > 1 each pool process builds its own FaceAnalysis and
+    pulls paths in chunks; imap keeps the results in input order. The
+    pool is capped at one process per core, and the cores are split
+    between the processes' ONNX Runtime sessions.
+    """
+    cores = os.cpu_count() or 1
+    workers = min(workers, len(paths), cores)
+    if workers <= 1:
+        for path in paths:
+            yield embed_image(path)
+        return
+    with multiprocessing.Pool(workers, initializer=init_worker,
+                              initargs=(cores // workers,)) as pool:
+        yield from pool.imap(embed_image, paths, chunksize=EXTRACT_CHUNKSIZE)
+
+def get_embeddings_for_ids(voter_ids, data_dir=DATA_DIR, cache=None,
+                           workers=EXTRACT_WORKERS):
+    items = list_images(voter_ids, data_dir)
+    # Embeddings saved by dataset.capture_faces() need no inference at all.
+    sidecars = {vid: load_embeddings(os.path.join(data_dir, vid)) for vid in voter_ids}
+    embs = [None] * len(items)
+    todo = []
+    for i, (vid, path) in enumerate(items):
+        captured = sidecars[vid].get(os.path.basename(path))
+        if captured is not None:
+            embs[i] = captured
+            continue
+        found, emb = cache.get(path) if cache else (False, None)
+        if found:
+            embs[i] = emb
+        else:
+            todo.append(i)
+
+    paths = [items[i][1] for i in todo]
+    for i, emb in zip(todo, extract_embeddings(paths, workers)):
+        embs[i] = emb
+        if cache:
+            cache.put(items[i][1], emb)
+
+    X = [emb for emb in embs if emb is not None]
+    y = [vid for (vid, _), emb in zip(items, embs) if emb is not None]
     return np.array(X), np.array(y)
 
-def update_centroids(existing_centroids, X, y):
-    buckets = defaultdict(list)
-    for lbl, cent in existing_centroids.items():
-        buckets[lbl].append(cent)
-    for emb, lbl in zip(X, y):
-        buckets[lbl].append(emb)
-    return {lbl: np.mean(embs, axis=0) for lbl, embs in buckets.items()}
+def save_cache(cache):
+    cache.save()
+    st = cache.stats()
+    print(f"[INFO] Embedding cache: {st['hits']} hits, {st['misses']} misses "
+          f"({st['hit_rate']:.0%} hit rate)")
+
+def voter_signature(folder):
+    """Fingerprint of a voter's sample files.
 
-def train_incrementally():
-    # 1. Load existing model (if exists)
+    Changes whenever an image is added, removed or re-captured in place.
+    """
+    h = hashlib.sha1()
+    for fname in sorted(os.listdir(folder)):
+        if fname.lower().endswith(('.jpg', '.jpeg', '.png')):
+            st = os.stat(os.path.join(folder, fname))
+            h.update(f"{fname}:{st.st_mtime_ns}:{st.st_size};".encode("utf-8"))
+    return h.hexdigest()
+
+def voter_sums(X, y):
+    """{label: (sum of embeddings, sample count)} for a batch of samples."""
+    if len(y) == 0:
+        return {}
+    labels, inverse, counts = np.unique(y, return_inverse=True, return_counts=True)
+    sums = np.zeros((len(labels), X.shape[1]), dtype=np.float64)
+    np.add.at(sums, inverse, X)
+    return {str(lbl): (sums[i], int(counts[i])) for i, lbl in enumerate(labels)}
+
+def build_index(gallery, index_path=INDEX_PATH):
+    if not BUILD_ANN_INDEX or len(gallery) < ANN_MIN_SIZE:
+        # Small gallery: exact search only, and drop any index that no
+        # longer matches it.
+        if os.path.exists(index_path):
+            os.remove(index_path)
+        return None
+    previous = IVFIndex.load(index_path) if os.path.exists(index_path) else None
+    if previous is not None and 0.5 <= len(gallery) / max(len(previous.labels), 1) <= 2:
+        # Gallery size is in the same range: keep the trained quantizer.
+        index = IVFIndex.from_coarse(gallery.labels, gallery.matrix, previous.coarse)
+    else:
+        index = IVFIndex.build(gallery.labels, gallery.matrix)
+    index.save(index_path)
+    print(f"[INFO] ANN index saved with {index.nlist} lists -> {index_path}")
+    return index
+
+def fit_classifier(voter_ids, cache, workers=EXTRACT_WORKERS):
+    # Needs every voter's samples; the sidecars and the cache keep this
+    # inference-free, but the fit itself grows with the gallery.
+    X_all, y_all = get_embeddings_for_ids(voter_ids, cache=cache, workers=workers)
+    if len(np.unique(y_all)) < 2:
+        return None
+    clf = SGDClassifier(loss='log_loss', max_iter=CLF_MAX_ITER)
+    clf.fit(X_all, y_all)
+    return clf
+
+def train_incrementally(workers=EXTRACT_WORKERS, mode=GALLERY_MODE):
+    # 1. Load existing gallery and training state (if exists)
+    gallery = Gallery.open(GALLERY_PATH) if os.path.exists(GALLERY_PATH) else None
+    signatures = {}
+    previous_mode = None
     if os.path.exists(MODEL_PATH):
         raw = joblib.load(MODEL_PATH)
         if isinstance(raw, dict):
-            clf = raw['clf']
-            centroids = raw['centroids']
-            previous_classes = raw.get('classes', sorted(centroids.keys()))
-            print(f"[INFO] Loaded model with classes: {previous_classes}")
-        else:
-            clf = raw
-            centroids = {}
-            previous_classes = sorted(getattr(clf, 'classes_', []))
-    else:
-        clf = SGDClassifier(loss='log_loss', max_iter=1000)
-        centroids = {}
-        previous_classes = []
+            signatures = raw.get('signatures', {})
+            previous_mode = raw.get('mode')
+            if gallery is None and raw.get('centroids'):
+                # Legacy pickle that still carries the centroids.
+                gallery = Gallery.from_centroids(raw['centroids'])
+    if gallery is None:
+        gallery = Gallery.from_centroids({})
+    print(f"[INFO] Loaded gallery with {len(gallery)} identities")
 
     # 2. Scan current voter folders
     all_ids = sorted([d for d in os.listdir(DATA_DIR)
@@ -67,39 +187,53 @@ def train_incrementally():
         print("[ERROR] No voter folders found.")
         return
 
-    print(f"[INFO] All IDs on disk: {all_ids}")
-    print(f"[INFO] Existing model classes: {previous_classes}")
-
-    # 3. Compare classes
-    same_class_set = sorted(previous_classes) == sorted(all_ids)
-
-    if same_class_set and previous_classes:
-        # Classes match → safe to use partial_fit
-        new_ids = sorted(set(all_ids) - set(previous_classes))
-        if not new_ids:
-            print("[INFO] No new IDs found. Skipping training.")
-            return
-        print(f"[INFO] Using incremental training on new IDs: {new_ids}")
-        X_new, y_new = get_embeddings_for_ids(new_ids)
-        if len(X_new) == 0:
-            print("[ERROR] No embeddings found. Aborting.")
-            return
-        clf.partial_fit(X_new, y_new, classes=np.array(all_ids))
-        centroids = update_centroids(centroids, X_new, y_new)
-    else:
-        # Class set has changed → retrain from scratch
-        print("[INFO] Class mismatch. Performing full retraining.")
-        X_all, y_all = get_embeddings_for_ids(all_ids)
-        if len(X_all) == 0:
-            print("[ERROR] No embeddings found. Aborting.")
-            return
-        clf = SGDClassifier(loss='log_loss', max_iter=1000)
-        clf.fit(X_all, y_all)
-        centroids = update_centroids({}, X_all, y_all)
-
-    # 4. Save model
-    joblib.dump({'clf': clf, 'centroids': centroids, 'classes': all_ids}, MODEL_PATH)
-    print(f"[INFO] Model saved with classes: {all_ids}")
+    # 3. Work out which voters were added, re-enrolled or removed. Voters
+    # without a stored signature (e.g. from a legacy pickle) are rebuilt.
+    current = {vid: voter_signature(os.path.join(DATA_DIR, vid)) for vid in all_ids}
+    changed = [vid for vid in all_ids if signatures.get(vid) != current[vid]]
+    on_disk = np.char.encode(np.asarray(all_ids, dtype=str), 'utf-8')
+    removed = [l.decode('utf-8') for l in gallery.labels[~np.isin(gallery.labels, on_disk)]]
+    # A state from before RERANKER_PATH existed has no re-ranker file yet.
+    missing = mode == 'classifier' and not os.path.exists(RERANKER_PATH)
+    if not changed and not removed and mode == previous_mode and not missing:
+        print("[INFO] No new, changed or removed IDs. Skipping training.")
+        return
+    print(f"[INFO] {len(changed)} new/changed IDs, {len(removed)} removed IDs")
+
+    # 4. Exact per-voter update: only the changed voters' samples are read
+    cache = EmbeddingCache.load(DATA_DIR, MODEL_NAME)
+    X_new, y_new = get_embeddings_for_ids(changed, cache=cache, workers=workers)
+    if removed:
+        cache.prune()
+    sums = voter_sums(X_new, y_new)
+    faceless = [vid for vid in changed if vid not in sums]
+    if faceless:
+        print(f"[WARN] No usable face for IDs: {faceless}")
+    gallery = gallery.updated(sums, remove=removed + faceless)
+
+    # 5. Classifier mode only: refit the re-ranker over every voter
+    clf = None
+    if mode == 'classifier':
+        t0 = time.time()
+        clf = fit_classifier(all_ids, cache, workers)
+        print(f"[INFO] Classifier fitted in {time.time() - t0:.2f}s")
+    # After the fit: it may have embedded unchanged voters' images too.
+    save_cache(cache)
+
+    # 6. Save gallery (atomically, booths may have it mapped), re-ranker and state
+    gallery.save(GALLERY_PATH)
+    if clf is not None:
+        ClassifierReranker.from_classifier(clf).save(RERANKER_PATH)
+    elif os.path.exists(RERANKER_PATH):
+        os.remove(RERANKER_PATH)
+    joblib.dump({'mode': mode, 'classes': all_ids, 'signatures': current}, MODEL_PATH)
+    print(f"[INFO] Gallery saved with {len(gallery)} identities")
+    build_index(gallery)
 
 if __name__ == "__main__":
-    train_incrementally()
+    parser = argparse.ArgumentParser(description="Train the face gallery from dataset/")
+    parser.add_argument("--workers", type=int, default=EXTRACT_WORKERS,
+                        help="embedding extraction processes")
+    parser.add_argument("--mode", choices=["centroid", "classifier"], default=GALLERY_MODE)
+    args = parser.parse_args()
+    train_incrementally(workers=args.workers, mode=args.mode)